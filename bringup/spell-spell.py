@@ -13,6 +13,8 @@ REG_SP = 1
 REG_EXEC = 2
 REG_STACK_TOP = 3
 
+REG_TRACE = 0x3C
+
 
 class SpellController(ttboard.cocotb.dut.DUT):
     def __init__(self, tt: DemoBoard):
@@ -131,7 +133,16 @@ class SpellController(ttboard.cocotb.dut.DUT):
             self.write_progmem(offset + index, opcode)
 
 
-def run():
+# Find the source code for the test program in spell-spell.spl
+# fmt: off
+test_program = [
+   127, 58, 119, 0, 129, 57, 57, 244, 62, 116, 109, 
+   59, 119, 250, 44, 0, 59, 119, 25, 44, 11, 64, 3, 61
+]
+# fmt: on
+
+
+def load(program):
     global spell
     tt = DemoBoard.get()
     tt.mode = RPMode.ASIC_RP_CONTROL
@@ -140,17 +151,38 @@ def run():
     tt.reset_project(True)
     tt.clock_project_once()
     tt.reset_project(False)
-    # Find the source code for the test program in spell-spell.spl
-    # fmt: off
-    test_program = [
-       127, 58, 119, 0, 129, 57, 57, 244, 62, 116, 109, 
-       59, 119, 250, 44, 0, 59, 119, 25, 44, 11, 64, 3, 61
-    ]
-    # fmt: on
-    spell.write_program(test_program)
+    spell.write_program(program)
+    return tt
+
+
+def run():
+    tt = load(test_program)
     print("Start")
     spell.execute(False)
     tt.clock_project_PWM(10_000_000)  # 10 MHz
 
 
-run()
+def trace(program=test_program, cycles=5000, filename="trace.txt"):
+    """
+    Runs the program with the execution trace enabled, sampling the trace port
+    (uio) once per clock. The CPU timing is the same as when running at full
+    speed, only the clock is slower. Copy the file to the host and decode it
+    with test/trace_decoder.py.
+    """
+    tt = load(program)
+    # Release uio before enabling the trace, which makes the project drive it
+    tt.uio_oe_pico.value = 0
+    spell.push(1)
+    spell.push(REG_TRACE)
+    spell.exec_opcode("w")
+    print("Tracing")
+    spell.execute(False)
+    with open(filename, "w") as f:
+        for cycle in range(cycles):
+            tt.clock_project_once()
+            f.write("%x %x\n" % (cycle, int(tt.uio_out.value)))
+    print("Trace saved to", filename)
+
+
+if __name__ == "__main__":
+    run()
@@ -9,7 +9,7 @@
 import argparse
 import json
 import os
-from typing import List
+from typing import List, Optional
 
 from openlane.common import get_opdks_rev
 from openlane.flows.misc import OpenInKLayout
@@ -18,6 +18,9 @@ from openlane.steps.odb import OdbpyStep
 from openlane.steps import OpenROAD
 import volare
 
+from macro_index import MacroIndex
+from step_cache import StepCache
+
 
 class CustomPower(OdbpyStep):
 
@@ -36,7 +39,17 @@ class CustomPower(OdbpyStep):
 
 
 class ProjectFlow(Classic):
-    pass
+    def __init__(self, *args, step_cache: Optional[StepCache] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.step_cache = step_cache
+        if step_cache is not None:
+            step_cache.set_flow_steps(self.Steps)
+
+    def run(self, *args, **kwargs):
+        # SequentialFlow.run instantiates and starts every class in self.Steps
+        if self.step_cache is not None:
+            self.Steps = self.step_cache.wrap_steps(self.Steps)
+        return super().run(*args, **kwargs)
 
 
 if __name__ == "__main__":
@@ -47,6 +60,15 @@ if __name__ == "__main__":
     parser.add_argument(
         "--open-in-klayout", action="store_true", help="Open last run in KLayout"
     )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Run every step, ignoring the step cache"
+    )
+    parser.add_argument(
+        "--cache-dir", default=StepCache.default_dir(), help="Step cache directory"
+    )
+    parser.add_argument(
+        "--cache-size", type=float, default=20, help="Step cache size limit, in GB"
+    )
 
     # Insert our custom step after the PDN generation
     ProjectFlow.Steps.insert(
@@ -62,15 +84,38 @@ if __name__ == "__main__":
     # Load fixed required config for UPW
     flow_cfg = json.loads(open("config.json", "r").read())
 
+    # Summarize the RAM32 macro timing the flow will see, in every corner of
+    # the MACROS config, against the clock period the flow constrains
+    clock_period = flow_cfg["CLOCK_PERIOD"]
+    macro_timing = MacroIndex().export()["lib"]
+    for corner in flow_cfg["MACROS"]["RAM32"]["lib"]:
+        timing = macro_timing[corner]
+        clock_to_output = timing["clock_to_output"]["Do0"]
+        print(
+            f"RAM32 {corner:17} CLK->Do0 {clock_to_output:.3f} ns "
+            f"({clock_to_output / clock_period:4.0%} of CLOCK_PERIOD), "
+            f"A0 setup {timing['setup']['A0']:.3f} ns"
+        )
+
     # Run flow
+    flow_kwargs = {}
+    step_cache = None
+    if not args.open_in_klayout and not args.no_cache:
+        step_cache = StepCache(args.cache_dir, int(args.cache_size * 1e9))
+        flow_kwargs["step_cache"] = step_cache
+
     flow_class = OpenInKLayout if args.open_in_klayout else ProjectFlow
     flow = flow_class(
         flow_cfg,
         design_dir=".",
         pdk_root=pdk_root,
         pdk="sky130A",
+        **flow_kwargs,
     )
 
     flow.start(
         tag="wokwi" if not args.open_in_klayout else None, last_run=args.open_in_klayout
     )
+
+    if step_cache is not None:
+        print(step_cache.report())
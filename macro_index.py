@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+
+#
+# Indexer for the RAM32 macro views (SPEF, Liberty, netlists)
+#
+# Copyright (c) 2024 Tiny Tapeout LTD
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import argparse
+import bisect
+import glob
+import json
+import mmap
+import os
+import re
+from typing import Dict, List
+
+INDEX_VERSION = 1
+MACROS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "macros")
+INDEX_FILE = ".macro_index.json"
+
+_LIB_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[(){};:,]|[^\s(){};:,"]+')
+_SPEF_NAME_RE = re.compile(rb"^\*(\d+) (\S+)$", re.M)
+_SPEF_DNET_RE = re.compile(rb"^\*D_NET (\S+) (\S+)$", re.M)
+_VERILOG_INSTANCE_RE = re.compile(rb"^ (\w+) (\\\S+ |\w+) ?\(", re.M)
+_VERILOG_PORT_RE = re.compile(rb"^ (input|output|inout)\s+(\[\d+:\d+\]\s+)?(\w+);", re.M)
+
+
+def _unescape(name: str) -> str:
+    return name.replace("\\", "")
+
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _file_stamp(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _floats(text: str) -> List[float]:
+    return [float(value) for value in text.replace('"', "").split(",") if value.strip()]
+
+
+def _interpolate(index: List[float], values: List[float], x: float) -> float:
+    """Linear interpolation in a 1-D Liberty table, extrapolating at the ends."""
+    if len(values) == 1:
+        return values[0]
+    i = min(max(bisect.bisect_left(index, x), 1), len(index) - 1)
+    x0, x1 = index[i - 1], index[i]
+    y0, y1 = values[i - 1], values[i]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def _index_liberty(path: str) -> dict:
+    """
+    Walks the Liberty file once and keeps what point queries need: the
+    operating conditions, the table templates, pin capacitances and every
+    timing arc with its tables.
+    """
+    with open(path, "r") as f:
+        text = re.sub(r"/\*.*?\*/", "", f.read(), flags=re.S).replace("\\\n", "")
+    tokens = _LIB_TOKEN_RE.findall(text)
+
+    result = {"voltage": None, "templates": {}, "pins": {}, "arcs": {}}
+    stack = []  # (group type, first arg, attributes)
+    pos = 0
+    while pos < len(tokens):
+        token = tokens[pos]
+        if token == "}":
+            group_type, name, attrs = stack.pop()
+            _close_liberty_group(result, stack, group_type, name, attrs)
+            pos += 1
+            continue
+        if token == ";":
+            pos += 1
+            continue
+        nxt = tokens[pos + 1]
+        if nxt == ":":
+            stack[-1][2][token] = tokens[pos + 2].strip('"')
+            pos += 3
+        elif nxt == "(":
+            end = tokens.index(")", pos)
+            args = [t.strip('"') for t in tokens[pos + 2 : end] if t != ","]
+            if tokens[end + 1] == "{":
+                stack.append((token, args[0] if args else "", {}))
+                pos = end + 2
+            else:
+                # Complex attribute, e.g. values("...") or index_1("...")
+                if stack:
+                    stack[-1][2][token] = ",".join(args)
+                pos = end + 1
+        else:
+            pos += 1
+    return result
+
+
+def _close_liberty_group(result: dict, stack: list, group_type: str, name: str, attrs: dict):
+    parent = stack[-1] if stack else None
+    if group_type == "library":
+        result["voltage"] = float(attrs.get("nom_voltage", 0)) or None
+    elif group_type == "lu_table_template":
+        result["templates"][name] = _floats(attrs.get("index_1", ""))
+    elif group_type == "pin":
+        result["pins"][name] = {
+            "direction": attrs.get("direction"),
+            "capacitance": float(attrs.get("capacitance", 0)),
+        }
+        result["arcs"].setdefault(name, []).extend(attrs.get("_arcs", []))
+    elif group_type == "timing" and parent is not None:
+        arc = {
+            "related_pin": attrs.get("related_pin"),
+            "timing_type": attrs.get("timing_type", "combinational"),
+            "tables": attrs.get("_tables", {}),
+        }
+        parent[2].setdefault("_arcs", []).append(arc)
+    elif parent is not None and "values" in attrs:
+        # cell_rise, rise_transition, rise_constraint, ...
+        parent[2].setdefault("_tables", {})[group_type] = {
+            "template": name,
+            "values": _floats(attrs["values"]),
+        }
+
+
+def _index_spef(path: str) -> dict:
+    mm = _map_file(path)
+    try:
+        start = mm.find(b"*NAME_MAP")
+        end = mm.find(b"*PORTS", start)
+        names = {
+            b"*" + m.group(1): _unescape(m.group(2).decode())
+            for m in _SPEF_NAME_RE.finditer(mm, start, end)
+        }
+        nets = {}
+        for m in _SPEF_DNET_RE.finditer(mm, end):
+            net = names.get(m.group(1), _unescape(m.group(1).decode()))
+            nets[net] = [m.start(), float(m.group(2))]
+        return {"nets": nets}
+    finally:
+        mm.close()
+
+
+def _index_verilog(path: str) -> dict:
+    mm = _map_file(path)
+    try:
+        instances = {}
+        cells: Dict[str, int] = {}
+        for m in _VERILOG_INSTANCE_RE.finditer(mm):
+            cell = m.group(1).decode()
+            if cell == "module":
+                continue
+            name = _unescape(m.group(2).decode().strip())
+            instances[name] = [cell, m.start()]
+            cells[cell] = cells.get(cell, 0) + 1
+        ports = {m.group(3).decode(): m.group(1).decode() for m in _VERILOG_PORT_RE.finditer(mm)}
+        return {"ports": ports, "instances": instances, "cells": cells}
+    finally:
+        mm.close()
+
+
+class MacroIndex:
+    """
+    Point queries on the RAM32 views in macros/, backed by a persistent index.
+
+    The first use parses every view and stores an index next to them (name
+    map, per-net SPEF offsets and total capacitance, Liberty pins and timing
+    arcs per corner, netlist instances). Later uses only load the index, and
+    re-index just the files whose size or mtime changed. Detailed SPEF and
+    netlist records are read lazily from memory-mapped files.
+    """
+
+    def __init__(self, macros_dir: str = MACROS_DIR, macro: str = "RAM32"):
+        self.macros_dir = macros_dir
+        self.macro = macro
+        self.index_path = os.path.join(macros_dir, INDEX_FILE)
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._index = self._load()
+
+    # Index maintenance
+
+    def _sources(self) -> Dict[str, tuple]:
+        """Maps each view file (relative to macros_dir) to (kind, corner)."""
+        sources = {}
+        for path in glob.glob(os.path.join(self.macros_dir, f"{self.macro}.*_.spef")):
+            corner = os.path.basename(path).split(".")[1].rstrip("_")
+            sources[os.path.relpath(path, self.macros_dir)] = ("spef", corner)
+        for path in glob.glob(os.path.join(self.macros_dir, f"{self.macro}.lib", "*", "*.lib")):
+            corner = os.path.basename(os.path.dirname(path))
+            sources[os.path.relpath(path, self.macros_dir)] = ("lib", corner)
+        for view in ("nl", "pnl"):
+            path = os.path.join(self.macros_dir, f"{self.macro}.{view}.v")
+            if os.path.exists(path):
+                sources[os.path.relpath(path, self.macros_dir)] = ("netlist", view)
+        return sources
+
+    def _load(self) -> dict:
+        index = {"version": INDEX_VERSION, "files": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                stored = json.load(f)
+            if stored.get("version") == INDEX_VERSION:
+                index = stored
+
+        indexers = {"spef": _index_spef, "lib": _index_liberty, "netlist": _index_verilog}
+        sources = self._sources()
+        changed = set(index["files"]) - set(sources)
+        for rel, (kind, corner) in sources.items():
+            path = os.path.join(self.macros_dir, rel)
+            entry = index["files"].get(rel)
+            if entry is None or entry["stamp"] != _file_stamp(path):
+                index["files"][rel] = {
+                    "kind": kind,
+                    "corner": corner,
+                    "stamp": _file_stamp(path),
+                    "data": indexers[kind](path),
+                }
+                changed.add(rel)
+        for rel in set(index["files"]) - set(sources):
+            del index["files"][rel]
+        if changed:
+            with open(self.index_path, "w") as f:
+                json.dump(index, f)
+        return index
+
+    def _entries(self, kind: str) -> Dict[str, tuple]:
+        return {
+            entry["corner"]: (rel, entry["data"])
+            for rel, entry in self._index["files"].items()
+            if entry["kind"] == kind
+        }
+
+    def _entry(self, kind: str, corner: str) -> tuple:
+        entries = self._entries(kind)
+        if corner not in entries:
+            raise KeyError(f"no {kind} view for corner {corner}; have {sorted(entries)}")
+        return entries[corner]
+
+    def _mmap(self, rel: str) -> mmap.mmap:
+        if rel not in self._maps:
+            self._maps[rel] = _map_file(os.path.join(self.macros_dir, rel))
+        return self._maps[rel]
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+    # Corners
+
+    def lib_corners(self) -> List[str]:
+        return sorted(self._entries("lib"))
+
+    def spef_corners(self) -> List[str]:
+        return sorted(self._entries("spef"))
+
+    # SPEF queries
+
+    def nets(self, corner: str = "nom") -> List[str]:
+        return sorted(self._entry("spef", corner)[1]["nets"])
+
+    def net_cap(self, net: str, corner: str = "nom") -> float:
+        """Total parasitic capacitance of a net, in pF."""
+        return self._entry("spef", corner)[1]["nets"][net][1]
+
+    def net_parasitics(self, net: str, corner: str = "nom") -> dict:
+        """The *D_NET record of a net: connections, capacitances and resistances."""
+        rel, data = self._entry("spef", corner)
+        offset = data["nets"][net][0]
+        mm = self._mmap(rel)
+        end = mm.find(b"*END", offset)
+        section = None
+        record = {"total_cap": data["nets"][net][1], "conn": [], "cap": [], "res": []}
+        for line in mm[offset:end].decode().splitlines()[1:]:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] in ("*CONN", "*CAP", "*RES"):
+                section = fields[0][1:].lower()
+            elif section == "conn":
+                record["conn"].append(fields[1:3])
+            elif section is not None:
+                record[section].append(fields[1:-1] + [float(fields[-1])])
+        return record
+
+    # Liberty queries
+
+    def pin_cap(self, pin: str, corner: str) -> float:
+        return self._entry("lib", corner)[1]["pins"][pin]["capacitance"]
+
+    def voltage(self, corner: str) -> float:
+        return self._entry("lib", corner)[1]["voltage"]
+
+    def arcs(self, pin: str, corner: str) -> List[dict]:
+        return self._entry("lib", corner)[1]["arcs"].get(pin, [])
+
+    def arc_value(
+        self,
+        pin: str,
+        related_pin: str,
+        timing_type: str,
+        table: str,
+        corner: str,
+        load: float = 0.0,
+    ) -> float:
+        """
+        Value of a Liberty table (e.g. cell_rise) for one timing arc,
+        interpolated at `load` pF for load-dependent tables.
+        """
+        data = self._entry("lib", corner)[1]
+        for arc in data["arcs"].get(pin, []):
+            if arc["related_pin"] == related_pin and arc["timing_type"] == timing_type:
+                values = arc["tables"][table]
+                index = data["templates"].get(values["template"], [])
+                return _interpolate(index, values["values"], load)
+        raise KeyError(f"no {timing_type} arc {related_pin} -> {pin} in {corner}")
+
+    def clock_to_output(self, pin: str, corner: str, load: float = 0.0) -> float:
+        """Worst of the rise / fall CLK -> pin delay, in ns."""
+        return max(
+            self.arc_value(pin, "CLK", "rising_edge", table, corner, load)
+            for table in ("cell_rise", "cell_fall")
+        )
+
+    def setup(self, pin: str, corner: str) -> float:
+        """Worst setup time of `pin` against CLK, in ns."""
+        return max(
+            (
+                value
+                for arc in self.arcs(pin, corner)
+                if arc["timing_type"].startswith("setup")
+                for table in arc["tables"].values()
+                for value in table["values"]
+            ),
+            default=0.0,
+        )
+
+    def hold(self, pin: str, corner: str) -> float:
+        """Worst hold time of `pin` against CLK, in ns."""
+        return max(
+            (
+                value
+                for arc in self.arcs(pin, corner)
+                if arc["timing_type"].startswith("hold")
+                for table in arc["tables"].values()
+                for value in table["values"]
+            ),
+            default=0.0,
+        )
+
+    def compare(self, query: str, *args, **kwargs) -> Dict[str, float]:
+        """
+        Runs a query across all corners of the view it reads:
+        compare("clock_to_output", "Do0[0]") or compare("net_cap", "CLK").
+        """
+        corners = self.spef_corners() if query.startswith("net") else self.lib_corners()
+        method = getattr(self, query)
+        return {corner: method(*args, corner=corner, **kwargs) for corner in corners}
+
+    # Netlist queries
+
+    def cell_counts(self, view: str = "nl") -> Dict[str, int]:
+        return self._entry("netlist", view)[1]["cells"]
+
+    def ports(self, view: str = "nl") -> Dict[str, str]:
+        return self._entry("netlist", view)[1]["ports"]
+
+    def instance(self, name: str, view: str = "nl") -> dict:
+        """Cell type and pin connections of a netlist instance."""
+        rel, data = self._entry("netlist", view)
+        cell, offset = data["instances"][name]
+        mm = self._mmap(rel)
+        text = mm[offset : mm.find(b";", offset)].decode()
+        connections = {
+            pin: _unescape(net.strip())
+            for pin, net in re.findall(r"\.(\w+)\(([^()]*)\)", text)
+        }
+        return {"cell": cell, "connections": connections}
+
+    # Export
+
+    def export(self, load: float = 0.0) -> dict:
+        """
+        Summary of the macro timing for the flow and timing sweeps: per
+        Liberty corner, the worst CLK -> Do0 delay and the worst setup/hold
+        per input bus; per SPEF corner, the parasitic load of every port net.
+        """
+        outputs = [p for p, d in self.ports().items() if d == "output"]
+        inputs = [p for p, d in self.ports().items() if d == "input" and p != "CLK"]
+        lib = {}
+        for corner in self.lib_corners():
+            pins = self._entry("lib", corner)[1]["pins"]
+
+            def bits(bus):
+                return [p for p in pins if p == bus or p.startswith(f"{bus}[")]
+
+            lib[corner] = {
+                "voltage": self.voltage(corner),
+                "clock_to_output": {
+                    bus: max(self.clock_to_output(p, corner, load) for p in bits(bus))
+                    for bus in outputs
+                },
+                "setup": {bus: max(self.setup(p, corner) for p in bits(bus)) for bus in inputs},
+                "hold": {bus: max(self.hold(p, corner) for p in bits(bus)) for bus in inputs},
+                "clk_cap": self.pin_cap("CLK", corner),
+            }
+        ports = set(self.ports())
+        spef = {
+            corner: {
+                net: self.net_cap(net, corner)
+                for net in self.nets(corner)
+                if net.split("[")[0] in ports
+            }
+            for corner in self.spef_corners()
+        }
+        return {"lib": lib, "spef": spef}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the RAM32 macro views")
+    parser.add_argument("--macros-dir", default=MACROS_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    delay = subparsers.add_parser("delay", help="CLK -> output pin delay")
+    delay.add_argument("pin", nargs="?", default="Do0[0]")
+    delay.add_argument("--load", type=float, default=0.0, help="Output load, in pF")
+    net = subparsers.add_parser("net", help="Parasitics of a net")
+    net.add_argument("name")
+    net.add_argument("--corner", default="nom")
+    instance = subparsers.add_parser("instance", help="Netlist instance")
+    instance.add_argument("name")
+    subparsers.add_parser("export", help="Timing summary, as JSON")
+    args = parser.parse_args()
+
+    index = MacroIndex(args.macros_dir)
+    if args.command == "delay":
+        for corner, value in index.compare("clock_to_output", args.pin, load=args.load).items():
+            print(f"{corner:20} {value:.4f} ns")
+    elif args.command == "net":
+        print(json.dumps(index.net_parasitics(args.name, args.corner), indent=2))
+    elif args.command == "instance":
+        print(json.dumps(index.instance(args.name), indent=2))
+    elif args.command == "export":
+        print(json.dumps(index.export(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
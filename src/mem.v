@@ -19,7 +19,10 @@ module spell_mem (
     output wire [7:0] porta_oe, // out enable
     input  wire [7:0] portb_in,
     output wire [7:0] portb_out,
-    output wire [7:0] portb_oe  // out enable
+    output wire [7:0] portb_oe, // out enable
+
+    /* Trace */
+    output wire trace_en
 );
 
   wire code_select = select && !memory_type_data;
@@ -52,7 +55,10 @@ module spell_mem (
       .porta_oe(porta_oe),
       .portb_in (portb_in),
       .portb_out(portb_out),
-      .portb_oe(portb_oe)
+      .portb_oe(portb_oe),
+
+      /* trace */
+      .trace_en(trace_en)
   );
 
   spell_mem_internal mem_internal (
@@ -12,7 +12,7 @@ module spell_mem_internal (
     input wire memory_type_data,
     input wire write,
     output wire [7:0] data_out,
-    output reg data_ready
+    output wire data_ready
 );
 
   localparam data_mem_size = 32;
@@ -33,7 +33,25 @@ module spell_mem_internal (
   wire [7:0] code_mem_out = code_mem_do[word_index+:8];
   reg [7:0] data_mem_out;
   wire [7:0] data_out_byte = memory_type_data ? data_mem_out : code_mem_out;
-  assign data_out = data_ready ? data_out_byte : 8'bx;
+
+  // Word cache: the last code memory word that was read, tagged by addr[7:2].
+  // Reads that hit it complete in the same cycle, without waiting for the RAM.
+  // Define SPELL_NO_WORD_CACHE to leave it out, e.g. to measure its speedup.
+`ifdef SPELL_NO_WORD_CACHE
+  localparam word_cache_enabled = 1'b0;
+`else
+  localparam word_cache_enabled = 1'b1;
+`endif  /* SPELL_NO_WORD_CACHE */
+  reg [31:0] word_cache;
+  reg [5:0] word_tag;
+  reg word_valid;
+  wire code_read = select && !write && !memory_type_data && code_mem_ready;
+  wire word_hit = word_cache_enabled && code_read && word_valid && word_tag == addr[7:2];
+  wire [7:0] word_cache_out = word_cache[word_index+:8];
+
+  reg mem_ready;
+  assign data_ready = mem_ready || word_hit;
+  assign data_out = word_hit ? word_cache_out : mem_ready ? data_out_byte : 8'bx;
 
 
   wire we = select && write;
@@ -69,11 +87,12 @@ module spell_mem_internal (
   always @(posedge clk) begin
     if (~rst_n) begin
       cycles <= 0;
-      data_ready <= 0;
+      mem_ready <= 0;
       data_mem_out <= 0;
       for (i = 0; i < data_mem_size; i++) data_mem[i] <= 8'h00;
       code_mem_ready <= 0;
       code_mem_init_addr <= 0;
+      word_valid <= 0;
     end else begin
       if (!code_mem_ready) begin
         code_mem_init_addr <= code_mem_init_addr + 1;
@@ -81,19 +100,27 @@ module spell_mem_internal (
           code_mem_ready <= 1;
         end
       end else if (!select) begin
-        data_ready <= 1'b0;
+        mem_ready <= 1'b0;
 `ifdef SPELL_INTERNAL_MEM_DELAY
         cycles <= 2'b11;
 `endif  /* SPELL_INTERNAL_MEM_DELAY */
       end else if (cycles > 0) begin
         cycles <= cycles - 1;
       end else begin
-        data_ready <= 1'b1;
+        mem_ready <= 1'b1;
         if (write) begin
           if (memory_type_data && addr < data_mem_size) begin
             data_mem[data_addr] <= data_in;
           end
+          if (!memory_type_data && word_tag == addr[7:2]) begin
+            word_valid <= 1'b0;
+          end
         end else begin
+          if (code_read && mem_ready && !word_hit) begin
+            word_cache <= code_mem_do;
+            word_tag   <= addr[7:2];
+            word_valid <= 1'b1;
+          end
           data_mem_out <= 8'h00;
           if (memory_type_data && addr < data_mem_size) begin
             data_mem_out <= data_mem[data_addr];
@@ -20,7 +20,10 @@ module spell_mem_io (
     /* porta */
     input  wire [7:0] portb_in,
     output reg  [7:0] portb_out,
-    output reg  [7:0] portb_oe    // out enable (active high)
+    output reg  [7:0] portb_oe,   // out enable (active high)
+
+    /* trace */
+    output reg        trace_en
 );
 
   localparam REG_PINB = 8'h36;
@@ -29,6 +32,7 @@ module spell_mem_io (
   localparam REG_PINA = 8'h39;
   localparam REG_DDRA = 8'h3a;
   localparam REG_PORTA = 8'h3b;
+  localparam REG_TRACE = 8'h3c;
 
   reg past_write;
 
@@ -38,6 +42,7 @@ module spell_mem_io (
       porta_oe   <= 8'b00000000;
       portb_out  <= 8'b00000000;
       portb_oe   <= 8'b00000000;
+      trace_en   <= 1'b0;
       data_out   <= 8'b0;
       data_ready <= 1'b0;
       past_write <= 1'b0;
@@ -90,6 +95,13 @@ module spell_mem_io (
               data_out <= porta_out;
             end
           end
+          REG_TRACE: begin
+            if (write) begin
+              trace_en <= data_in[0];
+            end else begin
+              data_out <= {7'b0000000, trace_en};
+            end
+          end
           default: begin
             if (~write) data_out <= 8'hff;
           end
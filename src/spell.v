@@ -39,6 +39,14 @@ module tt_um_urish_spell (
     | (porta_oe & porta_out)
   );
 
+  // When tracing, portb outputs the execution trace instead
+  wire trace_en;
+  wire [7:0] trace_out;
+  wire [7:0] portb_oe;
+  wire [7:0] portb_out;
+  assign uio_oe  = trace_en ? 8'hff : portb_oe;
+  assign uio_out = trace_en ? trace_out : portb_out;
+
   wire i_run = ui_in[0];
   wire i_step = ui_in[1];
   wire i_load = ui_in[2];
@@ -156,8 +164,20 @@ module tt_um_urish_spell (
       .porta_out(porta_out),
       .porta_oe(porta_oe),
       .portb_in(uio_in),
-      .portb_out(uio_out),
-      .portb_oe(uio_oe)
+      .portb_out(portb_out),
+      .portb_oe(portb_oe),
+      // Trace
+      .trace_en(trace_en)
+  );
+
+  spell_trace trace (
+      .rst_n(rst_n),
+      .clk(clk),
+      .enable(trace_en),
+      .execute(state == StateExecute && !out_of_order_exec),
+      .pc(pc),
+      .opcode(opcode),
+      .trace_out(trace_out)
   );
 
   function is_data_opcode(input [7:0] opcode_to_test);
@@ -0,0 +1,61 @@
+// SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@wokwi.com>
+// SPDX-License-Identifier: MIT
+
+`default_nettype none
+
+/*
+ * Execution trace port: emits one packet per executed instruction.
+ *
+ * Every packet starts with a header beat (bit 7 set), followed by one or two
+ * data beats (bit 7 clear). Idle cycles output 8'h00.
+ *
+ *   header: {1'b1, opcode[7:1]}
+ *   data 1: {1'b0, opcode[0], full, seq[3:0], full ? pc[7] : 1'b0}
+ *   data 2: {1'b0, pc[6:0]}                  (only for full packets)
+ *
+ * A full packet carries the PC. It is sent whenever the PC is not the
+ * previous PC + 1, and every 16 packets (seq == 0), so that a decoder that
+ * lost samples can resynchronize. The CPU never executes two instructions
+ * less than 3 cycles apart, so packets never overlap.
+ */
+module spell_trace (
+    input wire rst_n,
+    input wire clk,
+    input wire enable,
+    input wire execute,
+    input wire [7:0] pc,
+    input wire [7:0] opcode,
+    output reg [7:0] trace_out
+);
+
+  reg [3:0] seq;
+  reg [7:0] expected_pc;
+  reg [7:0] next_beat;
+  reg [6:0] pc_beat;
+  reg [1:0] pending_beats;
+
+  wire full = seq == 4'd0 || pc != expected_pc;
+
+  always @(posedge clk) begin
+    if (~rst_n || !enable) begin
+      trace_out <= 8'h00;
+      seq <= 4'd0;
+      expected_pc <= 8'h00;
+      pending_beats <= 2'd0;
+    end else if (execute) begin
+      trace_out <= {1'b1, opcode[7:1]};
+      next_beat <= {1'b0, opcode[0], full, seq, full & pc[7]};
+      pc_beat <= pc[6:0];
+      pending_beats <= full ? 2'd2 : 2'd1;
+      seq <= seq + 1;
+      expected_pc <= pc + 1;
+    end else if (pending_beats != 2'd0) begin
+      trace_out <= next_beat;
+      next_beat <= {1'b0, pc_beat};
+      pending_beats <= pending_beats - 1;
+    end else begin
+      trace_out <= 8'h00;
+    end
+  end
+
+endmodule
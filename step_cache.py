@@ -0,0 +1,308 @@
+#
+# Content-addressed cache for OpenLane flow steps
+#
+# Copyright (c) 2024 Tiny Tapeout LTD
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import dataclasses
+import enum
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from collections import UserString
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from openlane import __version__ as openlane_version
+from openlane.common import GenericDictEncoder, Path
+from openlane.state import DesignFormat
+
+CACHE_FORMAT = 1
+ENTRY_FILE = "entry.json"
+FILES_DIR = "files"
+STEP_DIR_PLACEHOLDER = "$STEP_DIR"
+
+# Written by Step.start() itself, so they are never restored from the cache
+STEP_BOOKKEEPING_FILES = {"config.json", "state_in.json", "state_out.json"}
+
+
+def _hash_file(path: str, hasher) -> None:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+
+
+def _hash_dir(path: str, hasher) -> None:
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            hasher.update(os.path.relpath(file_path, path).encode() + b"\0")
+            _hash_file(file_path, hasher)
+
+
+def _as_path(value: Any) -> Optional[str]:
+    """
+    Returns the string form of path-like values: str, os.PathLike and
+    OpenLane's Path, which is a UserString.
+    """
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    if isinstance(value, (str, UserString)):
+        return str(value)
+    return None
+
+
+def _digest_value(value: Any, hasher, hash_dirs: bool = False) -> None:
+    """
+    Feeds a config / state value into the hasher. Paths to existing files
+    are hashed by content, so that editing a source file, a macro view or a
+    Tcl script invalidates the steps that consume it. With `hash_dirs`,
+    directories are hashed by content too (used for state views; config
+    values such as DESIGN_DIR are hashed by name).
+    """
+    path = _as_path(value)
+    if isinstance(value, dict):
+        hasher.update(b"{")
+        for key in sorted(value, key=str):
+            _digest_value(str(key), hasher)
+            _digest_value(value[key], hasher, hash_dirs)
+        hasher.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b"[")
+        for item in value:
+            _digest_value(item, hasher, hash_dirs)
+        hasher.update(b"]")
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        _digest_value(dataclasses.asdict(value), hasher, hash_dirs)
+    elif isinstance(value, enum.Enum):
+        _digest_value(value.name, hasher)
+    elif path is not None and os.path.isfile(path):
+        hasher.update(b"file:")
+        _hash_file(path, hasher)
+    elif path is not None and hash_dirs and os.path.isdir(path):
+        hasher.update(b"dir:")
+        _hash_dir(path, hasher)
+    elif path is not None:
+        hasher.update(b"str:" + path.encode())
+    else:
+        hasher.update(repr(value).encode())
+    hasher.update(b";")
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _rebase_paths(value: Any, old_dir: str, new_dir: str, path_type=str) -> Any:
+    """
+    Replaces the `old_dir` prefix of every path in a view with `new_dir`,
+    converting the paths to `path_type`.
+    """
+    if isinstance(value, dict):
+        return {k: _rebase_paths(v, old_dir, new_dir, path_type) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rebase_paths(v, old_dir, new_dir, path_type) for v in value]
+    path = _as_path(value)
+    if path is None:
+        return value
+    if path == old_dir or path.startswith(old_dir + os.sep):
+        path = new_dir + path[len(old_dir) :]
+    return path_type(path)
+
+
+def _design_format(step, name: str) -> DesignFormat:
+    for fmt in getattr(step, "outputs", []):
+        if fmt.name == name:
+            return fmt
+    return DesignFormat[name]
+
+
+class StepCache:
+    """
+    Stores the outputs of flow steps in `cache_dir`, keyed by a hash of
+    everything the step reads: the views and metrics of its input state, the
+    config variables it can see, and its script. A step whose key is already
+    in the cache is not run; its step directory and state updates are
+    restored instead.
+
+    The cache is trimmed to `max_size` bytes, evicting the least recently
+    used entries first.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        self.results: List[Tuple[str, str]] = []
+        self._private_keys: Dict[str, set] = {}
+
+    def set_flow_steps(self, steps: Iterable[type]):
+        """
+        Records which config variables are declared by which steps, so that
+        a variable declared only by another step does not invalidate this one
+        (e.g. a PDN parameter does not invalidate synthesis).
+        """
+        owners: Dict[str, set] = {}
+        for step_cls in steps:
+            for variable in getattr(step_cls, "config_vars", []):
+                owners.setdefault(variable.name, set()).add(step_cls.id)
+        self._private_keys = {
+            step_cls.id: {
+                name
+                for name, ids in owners.items()
+                if step_cls.id not in ids
+            }
+            for step_cls in steps
+        }
+
+    def key_for(self, step, state_in) -> str:
+        hasher = hashlib.sha256()
+        _digest_value([CACHE_FORMAT, openlane_version, step.id], hasher)
+
+        excluded = self._private_keys.get(step.id, set())
+        config = {k: v for k, v in step.config.items() if k not in excluded}
+        _digest_value(config, hasher)
+
+        # Views are hashed by content: upstream outputs always live at the
+        # same runs/<tag>/NN-step paths, whatever they contain
+        _digest_value(dict(state_in.items()), hasher, hash_dirs=True)
+        _digest_value(dict(state_in.metrics), hasher)
+
+        get_script_path = getattr(step, "get_script_path", None)
+        if get_script_path is not None:
+            _digest_value(get_script_path(), hasher, hash_dirs=True)
+        step_cls = getattr(type(step), "__wrapped__", type(step))
+        if not step_cls.__module__.startswith("openlane"):
+            # Project-local steps (e.g. CustomPower) may change their command line
+            hasher.update(inspect.getsource(step_cls).encode())
+
+        return hasher.hexdigest()
+
+    def wrap(self, step_cls: type) -> type:
+        """
+        Returns a subclass of `step_cls` whose `run` consults the cache first.
+        Step.start() still takes care of the step directory and state
+        bookkeeping, so the flow cannot tell a cached step from a real one.
+        """
+        if "__wrapped__" in vars(step_cls):
+            return step_cls
+        cache = self
+
+        def run(step, state_in, **kwargs):
+            return cache.run_step(step, super(cached_cls, step).run, state_in, **kwargs)
+
+        cached_cls = type(
+            step_cls.__name__,
+            (step_cls,),
+            {
+                "run": run,
+                "__wrapped__": step_cls,
+                "__module__": step_cls.__module__,
+                "__qualname__": step_cls.__qualname__,
+            },
+        )
+        return cached_cls
+
+    def wrap_steps(self, steps: Iterable[type]) -> List[type]:
+        return [self.wrap(step_cls) for step_cls in steps]
+
+    def run_step(self, step, run, state_in, **kwargs):
+        key = self.key_for(step, state_in)
+        entry_dir = os.path.join(self.cache_dir, key)
+        restored = self._restore(entry_dir, step)
+        if restored is not None:
+            self.results.append((step.id, "skipped"))
+            return restored
+        views_updates, metrics_updates = run(state_in, **kwargs)
+        self._store(entry_dir, step, views_updates, metrics_updates)
+        self.results.append((step.id, "ran"))
+        return views_updates, metrics_updates
+
+    def _restore(self, entry_dir: str, step):
+        entry_file = os.path.join(entry_dir, ENTRY_FILE)
+        if not os.path.isfile(entry_file):
+            return None
+        with open(entry_file, "r") as f:
+            # OpenROAD steps report their metrics as Decimal
+            entry = json.load(f, parse_float=Decimal)
+        step_dir = os.path.abspath(step.step_dir)
+        files_dir = os.path.join(entry_dir, FILES_DIR)
+        shutil.copytree(files_dir, step_dir, dirs_exist_ok=True)
+        os.utime(entry_file)  # LRU bookkeeping
+        views = {
+            _design_format(step, name): _rebase_paths(
+                value, STEP_DIR_PLACEHOLDER, step_dir, Path
+            )
+            for name, value in entry["views"].items()
+        }
+        return views, entry["metrics"]
+
+    def _store(self, entry_dir: str, step, views_updates, metrics_updates):
+        step_dir = os.path.abspath(step.step_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        files_dir = os.path.join(tmp_dir, FILES_DIR)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            shutil.copytree(
+                step_dir,
+                files_dir,
+                ignore=lambda d, names: (
+                    STEP_BOOKKEEPING_FILES & set(names) if d == step_dir else []
+                ),
+            )
+            entry = {
+                "step": step.id,
+                "views": {
+                    fmt.name: _rebase_paths(value, step_dir, STEP_DIR_PLACEHOLDER)
+                    for fmt, value in views_updates.items()
+                },
+                "metrics": dict(metrics_updates),
+                "size": _dir_size(files_dir),
+            }
+            with open(os.path.join(tmp_dir, ENTRY_FILE), "w") as f:
+                json.dump(entry, f, indent=2, cls=GenericDictEncoder)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(tmp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits in max_size.
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_file = os.path.join(self.cache_dir, key, ENTRY_FILE)
+            if not os.path.isfile(entry_file):
+                continue
+            with open(entry_file, "r") as f:
+                size = json.load(f)["size"]
+            entries.append((os.path.getmtime(entry_file), size, key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            total -= size
+
+    def report(self) -> str:
+        skipped = sum(1 for _, result in self.results if result == "skipped")
+        lines = [f"Step cache: {skipped}/{len(self.results)} steps skipped"]
+        for step_id, result in self.results:
+            lines.append(f"  {result:8} {step_id}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def default_dir() -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), ".step_cache")
+
@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cocotb
+from cocotb.handle import (
+    HierarchyObject,
+    IntegerObject,
+    ModifiableObject,
+    NonHierarchyIndexableObject,
+    RealObject,
+)
+from cocotb.triggers import RisingEdge
+
+StateFetch = 0
+StateExecute = 2
+
+# Simulation-only debug registers, removed by synthesis
+DEBUG_SIGNALS = ("state_name", "reg_name")
+
+
+@dataclass
+class Activity:
+    cycles: int = 0
+    toggles: Dict[str, int] = field(default_factory=dict)
+    # Maps nets that are RAM32 pins to the pin name (e.g. "A0")
+    macro_pins: Dict[str, str] = field(default_factory=dict)
+    ram_instances: int = 0
+    ram_clocks: int = 0
+    # Only available in RTL simulation, where the CPU state register is visible
+    instructions: Optional[int] = None
+    # Code fetches read from the RAM32 (word cache hits are not counted)
+    ram_fetches: Optional[int] = None
+
+
+def _collect(handle, prefix: str, signals: List[Tuple[str, object]], macro_pins):
+    for child in handle:
+        name = f"{prefix}{child._name}"
+        if isinstance(child, HierarchyObject):
+            def_name = getattr(child, "_def_name", "")
+            if def_name == "RAM32":
+                for pin in child:
+                    if isinstance(pin, NonHierarchyIndexableObject):
+                        continue  # The memory array itself
+                    pin_name = f"{name}.{pin._name}"
+                    signals.append((pin_name, pin))
+                    macro_pins[pin_name] = pin._name
+            elif not def_name.startswith("sky130_"):
+                # Skip the internals of standard cells in gate-level simulation
+                _collect(child, f"{name}.", signals, macro_pins)
+        elif isinstance(child, NonHierarchyIndexableObject):
+            for index, element in enumerate(child):
+                signals.append((f"{name}[{index}]", element))
+        elif (
+            isinstance(child, ModifiableObject)
+            and not isinstance(child, (IntegerObject, RealObject))
+            and child._name not in DEBUG_SIGNALS
+        ):
+            signals.append((name, child))
+
+
+class ActivityMonitor:
+    """
+    Counts per-net toggles while the simulation runs, by sampling every net
+    of the design once per clock. Nothing is written to disk, so this works
+    for long workloads where a full VCD would be impractical.
+
+    Usage:
+
+        monitor = ActivityMonitor(dut.user_project, dut.clk)
+        monitor.start()
+        ... run the workload ...
+        activity = monitor.stop()
+    """
+
+    def __init__(self, design, clk):
+        self._design = design
+        self._clk = clk
+        self._signals: List[Tuple[str, object]] = []
+        self._macro_pins: Dict[str, str] = {}
+        _collect(design, "", self._signals, self._macro_pins)
+        self._ram_enables = [
+            handle
+            for name, handle in self._signals
+            if name.endswith(".EN0") and name in self._macro_pins
+        ]
+        self._state = getattr(design, "state", None)
+        self._mem_select = getattr(design, "mem_select", None)
+        # mem_data_ready is also set by word cache hits; mem_ready only when
+        # the word was read from the RAM32
+        mem_internal = getattr(getattr(design, "mem", None), "mem_internal", None)
+        self._ram_ready = getattr(mem_internal, "mem_ready", None)
+        self._task = None
+        self._activity = None
+        self._previous: List[Optional[int]] = []
+        self._counts: List[int] = []
+
+    @staticmethod
+    def _read(handle) -> Optional[int]:
+        try:
+            return handle.value.integer
+        except ValueError:
+            return None  # X / Z
+
+    def _sample(self):
+        read = self._read
+        previous = self._previous
+        counts = self._counts
+        for index, (_, handle) in enumerate(self._signals):
+            value = read(handle)
+            old = previous[index]
+            if value is not None and old is not None:
+                counts[index] += (value ^ old).bit_count()
+            if value is not None:
+                previous[index] = value
+
+        activity = self._activity
+        activity.cycles += 1
+        activity.ram_clocks += sum(read(en) == 1 for en in self._ram_enables)
+        if self._state is not None:
+            state = read(self._state)
+            if state == StateExecute:
+                activity.instructions += 1
+            elif (
+                state == StateFetch
+                and self._ram_ready is not None
+                and read(self._mem_select) == 1
+                and read(self._ram_ready) == 1
+            ):
+                activity.ram_fetches += 1
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self._clk)
+            self._sample()
+
+    def start(self):
+        self._activity = Activity(
+            macro_pins=dict(self._macro_pins),
+            ram_instances=len(self._ram_enables),
+            instructions=0 if self._state is not None else None,
+            ram_fetches=0 if self._ram_ready is not None else None,
+        )
+        self._previous = [self._read(handle) for _, handle in self._signals]
+        self._counts = [0] * len(self._signals)
+        self._task = cocotb.start_soon(self._run())
+
+    def stop(self) -> Activity:
+        self._task.kill()
+        activity = self._activity
+        activity.toggles = {
+            name: count
+            for (name, _), count in zip(self._signals, self._counts)
+            if count
+        }
+        # Sampling once per clock cannot see the clock itself: it toggles twice per cycle
+        for name, pin in self._macro_pins.items():
+            if pin == "CLK":
+                activity.toggles[name] = 2 * activity.cycles
+        return activity
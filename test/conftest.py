@@ -0,0 +1,10 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout LTD
+# SPDX-License-Identifier: Apache-2.0
+
+# Lets the host-side tests import the build tooling from the repository root
+# (step_cache.py, macro_index.py).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,269 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from activity import Activity
+
+MACROS_DIR = os.path.join(os.path.dirname(__file__), "..", "macros")
+DEFAULT_CORNER = "nom_tt_025C_1v80"
+
+# Average switched capacitance of a standard-cell net (wire + fanout pins), in pF.
+# Used for every net that has no better estimate.
+DEFAULT_NET_CAP = 0.005
+
+# RAM32 pins that switch on a code fetch: the address in, the word out
+FETCH_PINS = ("A0", "Do0")
+
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[(){};:,]|[^\s(){};:,"]+')
+
+
+@dataclass
+class LibertyGroup:
+    type: str
+    args: List[str]
+    attrs: Dict[str, str] = field(default_factory=dict)
+    groups: List["LibertyGroup"] = field(default_factory=list)
+
+    def find(self, type: str) -> List["LibertyGroup"]:
+        return [group for group in self.groups if group.type == type]
+
+
+def _unquote(token: str) -> str:
+    return token[1:-1] if token.startswith('"') else token
+
+
+def parse_liberty(text: str) -> LibertyGroup:
+    """
+    Minimal Liberty parser: groups, simple attributes and complex attributes.
+    Complex attributes (e.g. `values(...)`) are stored as a comma-joined string.
+    """
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S).replace("\\\n", "")
+    tokens = _TOKEN_RE.findall(text)
+    pos = 0
+
+    def parse_args():
+        nonlocal pos
+        args = []
+        pos += 1  # (
+        while tokens[pos] != ")":
+            if tokens[pos] != ",":
+                args.append(_unquote(tokens[pos]))
+            pos += 1
+        pos += 1  # )
+        return args
+
+    def parse_body(group: LibertyGroup):
+        nonlocal pos
+        while pos < len(tokens) and tokens[pos] != "}":
+            name = tokens[pos]
+            pos += 1
+            if tokens[pos] == ":":
+                pos += 1
+                group.attrs[name] = _unquote(tokens[pos])
+                pos += 1
+            elif tokens[pos] == "(":
+                args = parse_args()
+                if pos < len(tokens) and tokens[pos] == "{":
+                    pos += 1
+                    child = LibertyGroup(name, args)
+                    parse_body(child)
+                    pos += 1  # }
+                    group.groups.append(child)
+                else:
+                    group.attrs[name] = ",".join(args)
+            if pos < len(tokens) and tokens[pos] == ";":
+                pos += 1
+
+    root = LibertyGroup("root", [])
+    parse_body(root)
+    return root.groups[0]
+
+
+def _first_value(group: LibertyGroup, power_type: str) -> Optional[float]:
+    tables = group.find(power_type)
+    if not tables:
+        return None
+    return float(tables[0].attrs["values"].split(",")[0])
+
+
+class RAM32PowerModel:
+    """
+    Energy figures for a RAM32 macro, taken from a Liberty corner.
+
+    The RAM32 views shipped in macros/ only characterize timing and pin
+    capacitance; they carry no internal_power or leakage_power groups. Pin
+    switching energy is therefore always available, while the internal
+    (per-clock) and leakage figures fall back to `access_energy` / `leakage`
+    when the Liberty file does not provide them. `characterized` tells which
+    is the case.
+    """
+
+    def __init__(
+        self,
+        corner: str = DEFAULT_CORNER,
+        access_energy: Optional[float] = None,
+        leakage: Optional[float] = None,
+    ):
+        self.corner = corner
+        path = os.path.join(
+            MACROS_DIR, "RAM32.lib", corner, f"RAM32__{corner}.lib"
+        )
+        with open(path, "r") as f:
+            library = parse_liberty(f.read())
+        cell = library.find("cell")[0]
+
+        self.voltage = float(library.attrs["nom_voltage"])
+        self.pin_cap: Dict[str, float] = {}
+        internal_energy = 0.0
+        internal_found = False
+        pins = cell.find("pin") + [
+            pin for bus in cell.find("bus") for pin in bus.find("pin")
+        ]
+        for pin in pins:
+            name = pin.args[0].split("[")[0]
+            cap = float(pin.attrs.get("capacitance", 0))
+            # Average over the bits of a bus
+            count, total = self.pin_cap.get(name, (0, 0.0))
+            self.pin_cap[name] = (count + 1, total + cap)
+            for power in pin.find("internal_power"):
+                for power_type in ("rise_power", "fall_power"):
+                    value = _first_value(power, power_type)
+                    if value is not None:
+                        internal_energy += value
+                        internal_found = True
+        self.pin_cap = {name: total / count for name, (count, total) in self.pin_cap.items()}
+
+        cell_leakage = cell.attrs.get("cell_leakage_power")
+        self.characterized = internal_found or cell_leakage is not None
+        # Liberty power tables are in energy_unit (pJ here); leakage in leakage_power_unit (pW)
+        self.access_energy = internal_energy if internal_found else (access_energy or 0.0)
+        self.leakage = (
+            float(cell_leakage) * 1e-12 if cell_leakage is not None else (leakage or 0.0)
+        )
+
+    def pin_energy(self, pin: str, toggles: int) -> float:
+        """Energy in pJ for `toggles` transitions on `pin` (0.5 * C * V^2 each)."""
+        return 0.5 * self.pin_cap.get(pin, 0.0) * self.voltage**2 * toggles
+
+
+@dataclass
+class EnergyReport:
+    name: str
+    cycles: int
+    instructions: Optional[int]
+    ram_clocks: int
+    ram_fetches: Optional[int]
+    logic_energy: float  # pJ
+    ram_pin_energy: float  # pJ
+    ram_fetch_pin_energy: float  # pJ, on FETCH_PINS
+    ram_internal_energy: float  # pJ
+    leakage_energy: float  # pJ
+    clock_hz: float
+    ram_characterized: bool
+
+    @property
+    def total_energy(self) -> float:
+        return (
+            self.logic_energy
+            + self.ram_pin_energy
+            + self.ram_internal_energy
+            + self.leakage_energy
+        )
+
+    @property
+    def energy_per_cycle(self) -> float:
+        return self.total_energy / self.cycles if self.cycles else 0.0
+
+    @property
+    def energy_per_instruction(self) -> Optional[float]:
+        if not self.instructions:
+            return None
+        return self.total_energy / self.instructions
+
+    @property
+    def ram_pin_energy_per_fetch(self) -> Optional[float]:
+        if not self.ram_fetches:
+            return None
+        return self.ram_fetch_pin_energy / self.ram_fetches
+
+    @property
+    def average_power(self) -> float:
+        """Average power in uW, at clock_hz."""
+        return self.energy_per_cycle * self.clock_hz * 1e-6
+
+    def __str__(self) -> str:
+        lines = [
+            f"Workload {self.name}: {self.cycles} cycles, {self.instructions} instructions",
+            f"  logic:          {self.logic_energy:10.2f} pJ",
+            f"  RAM32 pins:     {self.ram_pin_energy:10.2f} pJ",
+            f"  RAM32 internal: {self.ram_internal_energy:10.2f} pJ"
+            + ("" if self.ram_characterized else " (not characterized in Liberty)"),
+            f"  leakage:        {self.leakage_energy:10.2f} pJ",
+            f"  total:          {self.total_energy:10.2f} pJ",
+            f"  per cycle:      {self.energy_per_cycle:10.4f} pJ",
+            f"  average power:  {self.average_power:10.2f} uW @ {self.clock_hz / 1e6:g} MHz",
+            # EN0 is tied to rst_n, so every RAM32 is clocked on every cycle
+            f"  RAM32 clocks:   {self.ram_clocks} (EN0 = rst_n: every cycle, per macro)",
+            f"  RAM32 fetches:  {self.ram_fetches}",
+        ]
+        if self.ram_pin_energy_per_fetch is not None:
+            lines.append(
+                f"  RAM32 pins per fetch: {self.ram_pin_energy_per_fetch:6.4f} pJ"
+                f" ({'/'.join(FETCH_PINS)})"
+            )
+        if self.energy_per_instruction is not None:
+            lines.append(f"  per instruction: {self.energy_per_instruction:9.2f} pJ")
+        return "\n".join(lines)
+
+
+def estimate_energy(
+    name: str,
+    activity: Activity,
+    ram: RAM32PowerModel,
+    net_cap: Optional[Dict[str, float]] = None,
+    default_net_cap: float = DEFAULT_NET_CAP,
+    clock_hz: float = 10e6,
+) -> EnergyReport:
+    """
+    Combines the toggle counts of a workload with the RAM32 Liberty data.
+
+    Nets inside a RAM32 instance (`activity.macro_pins`) are charged using the
+    macro pin capacitance; every other net uses `net_cap[net]` when given (e.g.
+    extracted from SPEF), or `default_net_cap` otherwise. The A0 / Do0 share
+    of the pin energy, divided by `activity.ram_fetches`, gives the RAM pin
+    energy of one code fetch.
+    """
+    net_cap = net_cap or {}
+    vdd2 = ram.voltage**2
+    logic_energy = 0.0
+    ram_pin_energy = 0.0
+    ram_fetch_pin_energy = 0.0
+    for net, toggles in activity.toggles.items():
+        pin = activity.macro_pins.get(net)
+        if pin is not None:
+            energy = ram.pin_energy(pin, toggles)
+            ram_pin_energy += energy
+            if pin in FETCH_PINS:
+                ram_fetch_pin_energy += energy
+        else:
+            logic_energy += 0.5 * net_cap.get(net, default_net_cap) * vdd2 * toggles
+
+    seconds = activity.cycles / clock_hz
+    return EnergyReport(
+        name=name,
+        cycles=activity.cycles,
+        instructions=activity.instructions,
+        ram_clocks=activity.ram_clocks,
+        ram_fetches=activity.ram_fetches,
+        logic_energy=logic_energy,
+        ram_pin_energy=ram_pin_energy,
+        ram_fetch_pin_energy=ram_fetch_pin_energy,
+        ram_internal_energy=ram.access_energy * activity.ram_clocks,
+        leakage_energy=ram.leakage * activity.ram_instances * seconds * 1e12,
+        clock_hz=clock_hz,
+        ram_characterized=ram.characterized,
+    )
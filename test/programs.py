@@ -0,0 +1,19 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+"""
+Test programs shared by the cocotb and host-side tests.
+"""
+
+# Multiplies 10 by 11 with an add loop, leaving 110 on the stack, then sleeps.
+# fmt: off
+MULTIPLY = [
+    10, 11,
+    1, 'w',
+    0, 'x',
+    'x', 1, 'r', '+',
+    'x', 6, '@',
+    1, 'r', '-',
+    'z',
+]
+# fmt: on
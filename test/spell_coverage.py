@@ -0,0 +1,397 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+"""
+Functional coverage for tt_um_urish_spell.
+
+Every clock, the collector samples the CPU state, opcode, stack pointer and
+the I/O register being accessed, and marks the matching bins. Each
+coverpoint is a bytearray with one byte per bin, so sampling never
+allocates Python objects.
+
+With SPELL_COVERAGE_DIR set, every test that calls reset() stores its
+coverage in that directory as <test name>.json. The command line merges
+these files, reports the gaps, and selects the tests that add coverage:
+
+    python spell_coverage.py report coverage/
+    python spell_coverage.py merge coverage/ -o merged.json
+    make TESTCASE=$(python spell_coverage.py select coverage/)
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+StateFetch = 0
+StateFetchData = 1
+StateExecute = 2
+StateStore = 3
+StateDelay = 4
+StateSleep = 5
+StateStop = 6
+
+STATE_NAMES = ["Fetch", "FetchData", "Execute", "Store", "Delay", "Sleep", "Stop"]
+
+LEGAL_TRANSITIONS = [
+    (StateFetch, StateFetch),
+    (StateFetch, StateFetchData),
+    (StateFetch, StateExecute),
+    (StateFetchData, StateFetchData),
+    (StateFetchData, StateExecute),
+    (StateExecute, StateFetch),
+    (StateExecute, StateStore),
+    (StateExecute, StateDelay),
+    (StateExecute, StateSleep),
+    (StateExecute, StateStop),
+    (StateStore, StateStore),
+    (StateStore, StateFetch),
+    (StateStore, StateSleep),
+    (StateDelay, StateDelay),
+    (StateDelay, StateFetch),
+    (StateDelay, StateSleep),
+    (StateSleep, StateSleep),
+    (StateSleep, StateFetch),
+    (StateSleep, StateFetchData),
+    (StateSleep, StateExecute),
+    (StateStop, StateStop),
+    (StateStop, StateFetch),
+    (StateStop, StateFetchData),
+    (StateStop, StateExecute),
+]
+
+OPCODES = "+-&^|><=@,2!?rwxz"
+OPCODE_NAMES = [f"'{op}'" for op in OPCODES] + ["0xff", "literal"]
+OPCODE_STOP = len(OPCODES)
+OPCODE_LITERAL = len(OPCODES) + 1
+OPCODE_CLASS = bytes(
+    OPCODES.index(chr(op)) if chr(op) in OPCODES else OPCODE_LITERAL
+    for op in range(255)
+) + bytes([OPCODE_STOP])
+
+SOURCES = ["run", "EXEC"]
+
+IO_FIRST = 0x20
+IO_LAST = 0x5F
+IO_REGS = {
+    0x36: "PINB",
+    0x37: "DDRB",
+    0x38: "PORTB",
+    0x39: "PINA",
+    0x3A: "DDRA",
+    0x3B: "PORTA",
+    0x3C: "TRACE",
+}
+
+SP_WRAP_BINS = ["31->0", "0->31"]
+
+
+class Coverpoint:
+    def __init__(self, name: str, bins: List[str], interesting: Optional[Iterable[int]] = None):
+        self.name = name
+        self.bins = bins
+        self.hits = bytearray(len(bins))
+        # Bins that are expected to be hit; the others are reported but not as gaps
+        self.interesting = list(range(len(bins)) if interesting is None else interesting)
+
+    def bitmap(self) -> int:
+        return sum(1 << i for i, hit in enumerate(self.hits) if hit)
+
+    def merge_bitmap(self, bitmap: int):
+        for index in range(len(self.bins)):
+            if bitmap >> index & 1:
+                self.hits[index] = 1
+
+    def gaps(self) -> List[str]:
+        return [self.bins[i] for i in self.interesting if not self.hits[i]]
+
+    def covered(self) -> int:
+        return sum(self.hits[i] for i in self.interesting)
+
+
+class Coverage:
+    def __init__(self):
+        self.state = Coverpoint("state", STATE_NAMES + ["Invalid"], range(len(STATE_NAMES)))
+        self.transition = Coverpoint(
+            "transition",
+            [f"{STATE_NAMES[a]}->{STATE_NAMES[b]}" for a, b in LEGAL_TRANSITIONS],
+        )
+        self.opcode = Coverpoint(
+            "opcode",
+            [f"{op} from {src}" for op in OPCODE_NAMES for src in SOURCES],
+        )
+        self.loop = Coverpoint(
+            "loop",
+            [
+                f"'@' from {src} with stack_belowtop{cond}"
+                for src in SOURCES
+                for cond in ("!=0", "==0")
+            ],
+        )
+        self.sp = Coverpoint("sp", [str(i) for i in range(32)])
+        self.sp_wrap = Coverpoint("sp_wrap", SP_WRAP_BINS)
+        io_bins = [
+            f"{access} {IO_REGS.get(addr, hex(addr))}"
+            for addr in range(IO_FIRST, IO_LAST + 1)
+            for access in ("read", "write")
+        ]
+        self.io = Coverpoint(
+            "io",
+            io_bins,
+            [
+                (addr - IO_FIRST) * 2 + write
+                for addr in IO_REGS
+                for write in (0, 1)
+            ],
+        )
+        # Transitions that do not exist in the FSM; anything here is a bug
+        self.illegal_transitions = set()
+
+    @property
+    def coverpoints(self) -> List[Coverpoint]:
+        return [
+            self.state,
+            self.transition,
+            self.opcode,
+            self.loop,
+            self.sp,
+            self.sp_wrap,
+            self.io,
+        ]
+
+    def to_dict(self) -> dict:
+        result = {cp.name: hex(cp.bitmap()) for cp in self.coverpoints}
+        result["illegal_transitions"] = sorted(self.illegal_transitions)
+        return result
+
+    def merge(self, data: dict):
+        for cp in self.coverpoints:
+            cp.merge_bitmap(int(data.get(cp.name, "0x0"), 16))
+        for a, b in data.get("illegal_transitions", []):
+            self.illegal_transitions.add((a, b))
+
+    def bitmap(self) -> int:
+        """All interesting bins, as a single int. Used for test selection."""
+        result = 0
+        offset = 0
+        for cp in self.coverpoints:
+            for i in cp.interesting:
+                result |= cp.hits[i] << (offset + i)
+            offset += len(cp.bins)
+        return result
+
+    def report(self) -> str:
+        lines = []
+        for cp in self.coverpoints:
+            total = len(cp.interesting)
+            lines.append(f"{cp.name}: {cp.covered()}/{total}")
+            for gap in cp.gaps():
+                lines.append(f"  missing: {gap}")
+        for a, b in sorted(self.illegal_transitions):
+            lines.append(f"ILLEGAL transition: {STATE_NAMES[a]}->{STATE_NAMES[b]}")
+        return "\n".join(lines)
+
+
+_TRANSITION_INDEX = {t: i for i, t in enumerate(LEGAL_TRANSITIONS)}
+_LOOP_OPCODE = OPCODES.index("@")
+
+
+class CoverageCollector:
+    """
+    Samples the design once per clock and updates a Coverage object.
+    Only works in RTL simulation, where the internal registers are visible.
+    """
+
+    def __init__(self, dut, coverage: Optional[Coverage] = None):
+        design = dut.user_project
+        self.coverage = coverage or Coverage()
+        self._clk = dut.clk
+        self._state = design.state
+        self._opcode = design.opcode
+        self._sp = design.sp
+        self._out_of_order_exec = design.out_of_order_exec
+        self._stack_belowtop = getattr(design, "exec").stack_belowtop
+        self._mem_select = design.mem_select
+        self._mem_type_data = design.mem_type_data
+        self._mem_write_en = design.mem_write_en
+        self._mem_addr = design.mem_addr
+
+    @staticmethod
+    def supported(dut) -> bool:
+        return hasattr(dut.user_project, "state")
+
+    def sample(self, prev_state: int, prev_sp: int) -> Tuple[int, int]:
+        cov = self.coverage
+        try:
+            state = self._state.value.integer
+            sp = self._sp.value.integer
+        except ValueError:
+            return prev_state, prev_sp  # X during reset
+
+        cov.state.hits[state] = 1
+        transition = _TRANSITION_INDEX.get((prev_state, state))
+        if transition is not None:
+            cov.transition.hits[transition] = 1
+        elif prev_state >= 0:
+            cov.illegal_transitions.add((prev_state, state))
+
+        cov.sp.hits[sp] = 1
+        if prev_sp == 31 and sp == 0:
+            cov.sp_wrap.hits[0] = 1
+        elif prev_sp == 0 and sp == 31:
+            cov.sp_wrap.hits[1] = 1
+
+        # The bins below are skipped while the signals they read are X / Z
+        if state == StateExecute:
+            try:
+                source = self._out_of_order_exec.value.integer
+                op_class = OPCODE_CLASS[self._opcode.value.integer]
+            except ValueError:
+                pass
+            else:
+                cov.opcode.hits[op_class * 2 + source] = 1
+                if op_class == _LOOP_OPCODE:
+                    try:
+                        zero = self._stack_belowtop.value.integer == 0
+                    except ValueError:
+                        pass
+                    else:
+                        cov.loop.hits[source * 2 + zero] = 1
+
+        if self._mem_select.value == 1 and self._mem_type_data.value == 1:
+            try:
+                addr = self._mem_addr.value.integer
+                write = self._mem_write_en.value.integer
+            except ValueError:
+                pass
+            else:
+                if IO_FIRST <= addr <= IO_LAST:
+                    cov.io.hits[(addr - IO_FIRST) * 2 + write] = 1
+
+        return state, sp
+
+    async def run(self, path: Optional[str] = None):
+        """
+        Samples until the test ends. If `path` is given, the coverage is
+        saved there when the test's tasks are killed.
+        """
+        from cocotb.triggers import RisingEdge
+
+        prev_state, prev_sp = -1, -1
+        try:
+            while True:
+                await RisingEdge(self._clk)
+                prev_state, prev_sp = self.sample(prev_state, prev_sp)
+        finally:
+            if path is not None:
+                save(self.coverage, path)
+
+
+def save(coverage: Coverage, path: str):
+    with open(path, "w") as f:
+        json.dump(coverage.to_dict(), f)
+
+
+def load(paths: Iterable[str]) -> Coverage:
+    coverage = Coverage()
+    for path in paths:
+        with open(path, "r") as f:
+            coverage.merge(json.load(f))
+    return coverage
+
+
+def _current_test_name() -> Optional[str]:
+    import cocotb
+
+    test = getattr(cocotb.regression_manager, "_test", None)
+    return getattr(test, "__qualname__", None) or getattr(test, "__name__", None)
+
+
+def start_coverage(dut) -> Optional[CoverageCollector]:
+    """
+    Starts collecting coverage for the current test, if SPELL_COVERAGE_DIR is set.
+    """
+    import cocotb
+
+    coverage_dir = os.environ.get("SPELL_COVERAGE_DIR")
+    if not coverage_dir or not CoverageCollector.supported(dut):
+        return None
+    name = _current_test_name()
+    if name is None:
+        return None
+    os.makedirs(coverage_dir, exist_ok=True)
+    collector = CoverageCollector(dut)
+    cocotb.start_soon(collector.run(os.path.join(coverage_dir, f"{name}.json")))
+    return collector
+
+
+def load_per_test(paths: Iterable[str]) -> Dict[str, Coverage]:
+    """
+    Loads coverage files per test name (the file name). Files of the same
+    test, e.g. from runs in parallel directories, are merged.
+    """
+    per_test: Dict[str, Coverage] = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r") as f:
+            per_test.setdefault(name, Coverage()).merge(json.load(f))
+    return per_test
+
+
+def select_tests(per_test: Dict[str, Coverage]) -> List[str]:
+    """
+    Greedy set cover: picks tests in order of how many new bins they add,
+    until no test adds anything.
+    """
+    bitmaps = {name: cov.bitmap() for name, cov in per_test.items()}
+    covered = 0
+    selected = []
+    while True:
+        name, gain = max(
+            ((name, (bitmap & ~covered).bit_count()) for name, bitmap in bitmaps.items()),
+            key=lambda item: item[1],
+            default=(None, 0),
+        )
+        if gain == 0:
+            return selected
+        selected.append(name)
+        covered |= bitmaps.pop(name)
+
+
+def _coverage_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.json")))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Report merged coverage and gaps")
+    report_parser.add_argument("paths", nargs="+")
+    merge_parser = subparsers.add_parser("merge", help="Merge coverage files")
+    merge_parser.add_argument("paths", nargs="+")
+    merge_parser.add_argument("-o", "--output", required=True)
+    select_parser = subparsers.add_parser(
+        "select", help="Print the tests that add coverage, as a TESTCASE list"
+    )
+    select_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    files = _coverage_files(args.paths)
+    if args.command == "report":
+        print(load(files).report())
+    elif args.command == "merge":
+        save(load(files), args.output)
+    elif args.command == "select":
+        print(",".join(select_tests(load_per_test(files))))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+"""
+Instruction-level Python model of the SPELL CPU, following src/execute.v.
+"""
+
+from typing import List, Optional, Union
+
+REG_PINB = 0x36
+REG_DDRB = 0x37
+REG_PORTB = 0x38
+REG_PINA = 0x39
+REG_DDRA = 0x3A
+REG_PORTA = 0x3B
+REG_TRACE = 0x3C
+
+DATA_MEM_SIZE = 32
+
+
+def assemble(program: List[Union[int, str]]) -> bytes:
+    """Converts a program given as opcode characters and numbers to bytes."""
+    return bytes(ord(opcode) if type(opcode) == str else opcode for opcode in program)
+
+
+class SpellModel:
+    def __init__(self, program: Optional[List[Union[int, str]]] = None):
+        self.reset()
+        if program is not None:
+            self.load(program)
+
+    def reset(self):
+        self.pc = 0
+        self.sp = 0
+        self.stack = [0] * 32
+        self.code = bytearray([0xFF] * 256)
+        self.data = bytearray(DATA_MEM_SIZE)
+        self.io = {REG_PORTA: 0, REG_DDRA: 0, REG_PORTB: 0, REG_DDRB: 0, REG_TRACE: 0}
+        self.portb_in = 0
+        self.sleeping = True
+        self.delay_ms = 0
+
+    def load(self, program: List[Union[int, str]], offset: int = 0):
+        """Writes a program into code memory, like SpellController.write_program()."""
+        code = assemble(program)
+        self.code[offset : offset + len(code)] = code
+
+    @property
+    def stack_top(self) -> int:
+        return self.stack[(self.sp - 1) & 31]
+
+    @stack_top.setter
+    def stack_top(self, value: int):
+        self.stack[(self.sp - 1) & 31] = value & 0xFF
+
+    @property
+    def stack_belowtop(self) -> int:
+        return self.stack[(self.sp - 2) & 31]
+
+    def push(self, value: int):
+        self.stack[self.sp] = value & 0xFF
+        self.sp = (self.sp + 1) & 31
+
+    def read_data(self, addr: int) -> int:
+        if addr < DATA_MEM_SIZE:
+            return self.data[addr]
+        if addr == REG_PINB:
+            return self.portb_in
+        if addr == REG_PINA:
+            return 0x00
+        if addr in self.io:
+            return self.io[addr]
+        return 0xFF if 0x20 <= addr < 0x60 else 0x00
+
+    def write_data(self, addr: int, value: int):
+        if addr < DATA_MEM_SIZE:
+            self.data[addr] = value
+        elif addr == REG_PINB:
+            self.io[REG_PORTB] ^= value
+        elif addr == REG_PINA:
+            self.io[REG_PORTA] ^= value
+        elif addr == REG_TRACE:
+            self.io[addr] = value & 1
+        elif addr in self.io:
+            self.io[addr] = value
+
+    def execute(self, opcode: int, out_of_order: bool = False):
+        """
+        Executes a single opcode. Returns "sleep", "stop" or None.
+        """
+        top = self.stack_top
+        belowtop = self.stack_belowtop
+        next_pc = self.pc if out_of_order else (self.pc + 1) & 0xFF
+        result = None
+        op = chr(opcode)
+        if op in "+-&^|":
+            self.sp = (self.sp - 1) & 31
+            if op == "+":
+                self.stack_top = belowtop + top
+            elif op == "-":
+                self.stack_top = belowtop - top
+            elif op == "&":
+                self.stack_top = belowtop & top
+            elif op == "^":
+                self.stack_top = belowtop ^ top
+            else:
+                self.stack_top = belowtop | top
+        elif op == ">":
+            self.stack_top = top >> 1
+        elif op == "<":
+            self.stack_top = top << 1
+        elif op == "=":
+            next_pc = top
+            self.sp = (self.sp - 1) & 31
+        elif op == "@":
+            if belowtop != 0:
+                next_pc = top
+                self.sp = (self.sp - 1) & 31
+                self.stack_top = belowtop - 1
+            else:
+                self.sp = (self.sp - 2) & 31
+        elif op == ",":
+            self.delay_ms += top
+            self.sp = (self.sp - 1) & 31
+        elif op == "2":
+            self.push(top)
+        elif op == "!":
+            self.code[top] = belowtop
+            self.sp = (self.sp - 2) & 31
+        elif op == "?":
+            self.stack_top = self.code[top]
+        elif op == "r":
+            self.stack_top = self.read_data(top)
+        elif op == "w":
+            self.write_data(top, belowtop)
+            self.sp = (self.sp - 2) & 31
+        elif op == "x":
+            self.stack_top = belowtop
+            self.stack[(self.sp - 2) & 31] = top
+        elif op == "z":
+            result = "sleep"
+        elif opcode == 0xFF:
+            result = "stop"
+        else:
+            self.push(opcode)
+        self.pc = next_pc
+        self.sleeping = result == "sleep"
+        return result
+
+    def step(self):
+        return self.execute(self.code[self.pc])
+
+    def run(self, max_steps: int = 100000):
+        for _ in range(max_steps):
+            result = self.step()
+            if result is not None:
+                return result
+        return None
+
+    def trace(self, max_steps: int = 100000):
+        """
+        Runs like run(), and returns the (pc, opcode) of every executed instruction.
+        """
+        executed = []
+        for _ in range(max_steps):
+            executed.append((self.pc, self.code[self.pc]))
+            if self.step() is not None:
+                break
+        return executed
@@ -0,0 +1,596 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+"""
+Shared access to SPELL boards and simulators.
+
+The service owns one or more backends (a board, a simulator, or the Python
+model) and serves load / run / step / snapshot / dump / reset / cancel
+requests from many clients over a local socket, speaking newline-delimited
+JSON:
+
+    {"id": 1, "board": "board0", "op": "load", "image": [1, 55, 119], "offset": 0}
+    {"id": 1, "ok": true, "result": {"hash": "..."}}
+
+Every client connection gets its own view of each board: program memory,
+PC and stack. When the board switches between clients, the service saves
+the CPU state of the previous client and restores the next one. Program
+memory is only written right before a client's code runs. At that point
+the service writes just the bytes that differ from what the board already
+holds, and skips the write entirely when the content hash matches.
+Clients that load the same program therefore do not pay for reloading it.
+
+Requests queued for a board are handled in batches, grouped by client to
+avoid needless switches. Long runs are split into `quantum` instructions,
+so one client cannot keep the board to itself; the client's later requests
+wait until its run is done. A cancel request is not queued: it stops the
+client's run and fails its pending requests. Disconnecting does the same.
+
+Other boards are served with --controller, given a factory that returns a
+controller for the board (see ControllerBackend for what it must provide):
+
+    python spell_service.py --controller board0=my_board:open_controller
+
+No such host-side controller ships with this repository: the cocotb
+controller (spell_controller.py) needs the cocotb scheduler, and the one in
+bringup/ runs in MicroPython on the demo board.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from spell_model import SpellModel
+
+MEM_SIZE = 256
+STACK_SIZE = 32
+OPCODE_SLEEP = ord("z")
+OPCODE_STOP = 0xFF
+OPCODE_WRITE_CODE = ord("!")
+
+
+class MockBackend:
+    """
+    Backend running the Python model of the CPU, for tests without hardware.
+    Counts the program memory writes, like a real board would pay for them.
+    """
+
+    def __init__(self):
+        self.model = SpellModel()
+        self.writes = 0
+
+    async def read_byte(self, addr: int) -> int:
+        return self.model.code[addr]
+
+    async def write_byte(self, addr: int, value: int):
+        self.writes += 1
+        self.model.code[addr] = value
+
+    async def read_pc(self) -> int:
+        return self.model.pc
+
+    async def set_pc(self, value: int):
+        self.model.pc = value
+
+    async def read_sp(self) -> int:
+        return self.model.sp
+
+    async def set_sp(self, value: int):
+        self.model.sp = value & (STACK_SIZE - 1)
+
+    async def read_stack_top(self) -> int:
+        return self.model.stack_top
+
+    async def push(self, value: int):
+        self.model.push(value)
+
+    async def single_step(self):
+        self.model.step()
+
+
+class ControllerBackend:
+    """
+    Backend wrapping a host-side controller object. The controller must
+    provide the SpellController methods the service uses:
+
+        write_progmem(addr, value), exec_opcode(opcode), push(value),
+        read_sp(), set_sp(value), read_stack_top(), read_pc(),
+        set_pc(value), single_step()
+
+    Each may be a plain function, which runs in a worker thread (e.g. one
+    that talks to the board over a serial port), or an asyncio coroutine
+    function. cocotb coroutines do not work here: the service runs on an
+    asyncio event loop, not under the cocotb scheduler.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.writes = 0
+
+    async def _call(self, method: str, *args):
+        func = getattr(self.controller, method)
+        if inspect.iscoroutinefunction(func):
+            return await func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def read_byte(self, addr: int) -> int:
+        sp = await self._call("read_sp")
+        await self._call("push", addr)
+        await self._call("exec_opcode", "?")
+        value = await self._call("read_stack_top")
+        await self._call("set_sp", sp)
+        return value
+
+    async def write_byte(self, addr: int, value: int):
+        self.writes += 1
+        await self._call("write_progmem", addr, value)
+
+    async def read_pc(self) -> int:
+        return await self._call("read_pc")
+
+    async def set_pc(self, value: int):
+        await self._call("set_pc", value)
+
+    async def read_sp(self) -> int:
+        return await self._call("read_sp")
+
+    async def set_sp(self, value: int):
+        await self._call("set_sp", value)
+
+    async def read_stack_top(self) -> int:
+        return await self._call("read_stack_top")
+
+    async def push(self, value: int):
+        await self._call("push", value)
+
+    async def single_step(self):
+        await self._call("single_step")
+
+
+def image_hash(memory: bytes) -> str:
+    return hashlib.sha256(memory).hexdigest()
+
+
+@dataclass
+class Context:
+    """A client's view of a board."""
+
+    memory: bytearray = field(
+        default_factory=lambda: bytearray([OPCODE_STOP] * MEM_SIZE)
+    )
+    pc: int = 0
+    sp: int = 0
+    stack: List[int] = field(default_factory=lambda: [0] * STACK_SIZE)
+
+
+@dataclass(eq=False)
+class Job:
+    session: int
+    op: str
+    args: dict
+    future: asyncio.Future
+    # Instructions left for run jobs; None runs until the program halts
+    remaining: Optional[int] = None
+
+
+class ServiceError(Exception):
+    pass
+
+
+class Board:
+    def __init__(self, name: str, backend, quantum: int, erased: bool = True):
+        self.name = name
+        self.backend = backend
+        self.quantum = quantum
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.contexts: Dict[int, Context] = {}
+        self.owner: Optional[int] = None
+        # Last known content of the board's program memory, or None if the
+        # running program may have changed it. A board that was just reset
+        # is filled with 0xFF.
+        self.shadow: Optional[bytearray] = Context().memory if erased else None
+        self.shadow_hash = image_hash(self.shadow) if erased else None
+        self.switches = 0
+        self.steps = 0
+        # Jobs that were queued and are not done yet
+        self.jobs: Set[Job] = set()
+        # Jobs the worker carries over to its next batch
+        self.carried: List[Job] = []
+
+    def context(self, session: int) -> Context:
+        return self.contexts.setdefault(session, Context())
+
+    def submit(self, job: Job):
+        self.jobs.add(job)
+        job.future.add_done_callback(lambda _: self.jobs.discard(job))
+        self.queue.put_nowait(job)
+
+    def cancel(self, session: int) -> int:
+        """
+        Fails the client's pending jobs, including a run in progress, which
+        stops at its next instruction. Returns the number of jobs cancelled.
+        """
+        cancelled = 0
+        for job in list(self.jobs):
+            if job.session == session and not job.future.done():
+                job.future.set_exception(ServiceError("cancelled"))
+                cancelled += 1
+        return cancelled
+
+    def forget(self, session: int):
+        self.cancel(session)
+        self.carried[:] = [job for job in self.carried if job.session != session]
+        self.contexts.pop(session, None)
+        if self.owner == session:
+            self.owner = None
+
+    async def _read_memory(self) -> bytearray:
+        if self.shadow is None:
+            self.shadow = bytearray(
+                [await self.backend.read_byte(addr) for addr in range(MEM_SIZE)]
+            )
+            self.shadow_hash = image_hash(self.shadow)
+        return self.shadow
+
+    async def _write_memory(self, memory: bytearray) -> int:
+        """Brings the board's memory to `memory`, writing only what differs."""
+        target_hash = image_hash(memory)
+        if self.shadow is not None and self.shadow_hash == target_hash:
+            return 0
+        current = self.shadow or bytearray(MEM_SIZE)
+        written = 0
+        for addr in range(MEM_SIZE):
+            if self.shadow is None or current[addr] != memory[addr]:
+                await self.backend.write_byte(addr, memory[addr])
+                written += 1
+        self.shadow = bytearray(memory)
+        self.shadow_hash = target_hash
+        return written
+
+    async def _save(self, session: int):
+        ctx = self.context(session)
+        backend = self.backend
+        ctx.pc = await backend.read_pc()
+        ctx.sp = await backend.read_sp()
+        for index in range(STACK_SIZE):
+            await backend.set_sp((index + 1) % STACK_SIZE)
+            ctx.stack[index] = await backend.read_stack_top()
+        await backend.set_sp(ctx.sp)
+
+    async def _restore(self, session: int):
+        ctx = self.context(session)
+        backend = self.backend
+        await backend.set_sp(0)
+        for value in ctx.stack:
+            await backend.push(value)
+        await backend.set_sp(ctx.sp)
+        await backend.set_pc(ctx.pc)
+
+    async def activate(self, session: int):
+        """
+        Makes the board hold the client's CPU state. Program memory is only
+        written right before the client's code runs, so loads from several
+        clients coalesce into at most one write per differing byte.
+        """
+        if self.owner == session:
+            return
+        if self.owner is not None:
+            await self._save(self.owner)
+        await self._restore(session)
+        self.owner = session
+        self.switches += 1
+
+    async def _step(self, ctx: Context) -> Optional[str]:
+        """Executes one instruction. Returns "sleep" / "stop" if it halted the CPU."""
+        pc = await self.backend.read_pc()
+        if self.shadow is None:
+            await self._read_memory()
+        opcode = self.shadow[pc]
+        if opcode == OPCODE_WRITE_CODE:
+            # Writes stack_belowtop to the code address on top of the stack
+            addr = await self.backend.read_stack_top()
+        await self.backend.single_step()
+        self.steps += 1
+        if opcode == OPCODE_WRITE_CODE:
+            # Read the byte back, so the shadow copy stays valid
+            value = await self.backend.read_byte(addr)
+            self.shadow[addr] = value
+            self.shadow_hash = image_hash(self.shadow)
+            ctx.memory[addr] = value
+        if opcode == OPCODE_SLEEP:
+            return "sleep"
+        if opcode == OPCODE_STOP:
+            return "stop"
+        return None
+
+    async def _snapshot(self) -> dict:
+        sp = await self.backend.read_sp()
+        stack = []
+        for index in range(sp):
+            await self.backend.set_sp(index + 1)
+            stack.append(await self.backend.read_stack_top())
+        await self.backend.set_sp(sp)
+        return {"pc": await self.backend.read_pc(), "sp": sp, "stack": stack}
+
+    async def handle(self, job: Job) -> Optional[dict]:
+        """
+        Runs (a slice of) a job. Returns its result, or None if the job needs
+        another slice.
+        """
+        await self.activate(job.session)
+        args = job.args
+        if job.op == "load":
+            image = bytes(args["image"])
+            offset = int(args.get("offset", 0))
+            if offset + len(image) > MEM_SIZE:
+                raise ServiceError("image does not fit in program memory")
+            memory = self.context(job.session).memory
+            memory[offset : offset + len(image)] = image
+            return {"hash": image_hash(memory)}
+        elif job.op == "reset":
+            self.contexts[job.session] = Context()
+            await self._restore(job.session)
+            return {}
+        elif job.op in ("run", "step"):
+            ctx = self.context(job.session)
+            await self._write_memory(ctx.memory)
+            budget = self.quantum if job.remaining is None else min(self.quantum, job.remaining)
+            halted = None
+            for _ in range(budget):
+                if job.future.done():
+                    return None  # Cancelled
+                halted = await self._step(ctx)
+                if job.remaining is not None:
+                    job.remaining -= 1
+                if halted:
+                    break
+            if not halted and job.remaining != 0:
+                return None
+            result = await self._snapshot()
+            result["halted"] = halted
+            return result
+        elif job.op == "snapshot":
+            return await self._snapshot()
+        elif job.op == "dump":
+            return {"memory": list(self.context(job.session).memory)}
+        raise ServiceError(f"unknown op: {job.op}")
+
+    async def worker(self):
+        # Jobs carried over to the next batch, ahead of anything queued since:
+        # an unfinished run and every later job of the same client
+        carried = self.carried
+        while True:
+            batch = list(carried) or [await self.queue.get()]
+            carried.clear()
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # Group by client, starting with the current owner, to keep context
+            # switches down. Order within a client is preserved.
+            sessions = list(dict.fromkeys(job.session for job in batch))
+            if self.owner in sessions:
+                sessions.remove(self.owner)
+                sessions.insert(0, self.owner)
+            for session in sessions:
+                unfinished = False
+                for job in (job for job in batch if job.session == session):
+                    if job.future.done():
+                        continue  # Cancelled, or the client went away
+                    if unfinished:
+                        carried.append(job)
+                        continue
+                    try:
+                        result = await self.handle(job)
+                    except Exception as e:
+                        result = e
+                    if job.future.done():
+                        continue
+                    if result is None:
+                        carried.append(job)
+                        unfinished = True
+                    elif isinstance(result, Exception):
+                        job.future.set_exception(result)
+                    else:
+                        job.future.set_result(result)
+            # Let clients queue more requests, even when the backend never blocks
+            await asyncio.sleep(0)
+
+
+class SpellService:
+    def __init__(self, backends: Dict[str, object], quantum: int = 1000, erased: bool = True):
+        self.boards = {
+            name: Board(name, backend, quantum, erased)
+            for name, backend in backends.items()
+        }
+        self._sessions = itertools.count(1)
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        for board in self.boards.values():
+            self._workers.append(asyncio.create_task(board.worker()))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def open_session(self) -> int:
+        return next(self._sessions)
+
+    def close_session(self, session: int):
+        for board in self.boards.values():
+            board.forget(session)
+
+    async def request(self, session: int, board: str, op: str, **args) -> dict:
+        if board not in self.boards:
+            raise ServiceError(f"unknown board: {board}")
+        if op == "cancel":
+            # Not queued: it would wait behind the run it is meant to stop
+            return {"cancelled": self.boards[board].cancel(session)}
+        remaining = None
+        if op == "step":
+            remaining = int(args.get("count", 1))
+        elif op == "run" and args.get("max_steps") is not None:
+            remaining = int(args["max_steps"])
+        future = asyncio.get_running_loop().create_future()
+        self.boards[board].submit(Job(session, op, args, future, remaining))
+        return await future
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = self.open_session()
+        pending = set()
+
+        async def reply(message: dict):
+            response = {"id": message.get("id")}
+            try:
+                args = {k: v for k, v in message.items() if k not in ("id", "board", "op")}
+                response["result"] = await self.request(
+                    session, message.get("board"), message.get("op"), **args
+                )
+                response["ok"] = True
+            except Exception as e:
+                response["ok"] = False
+                response["error"] = str(e)
+            if not writer.is_closing():
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(reply(json.loads(line)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            # The client went away: stop its runs and free its contexts
+            self.close_session(session)
+            await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+
+    async def serve(self, path: str):
+        self.start()
+        server = await asyncio.start_unix_server(self._handle_client, path=path)
+        async with server:
+            await server.serve_forever()
+
+
+class SpellClient:
+    """Client for a SpellService listening on a Unix socket."""
+
+    def __init__(self, board: str):
+        self.board = board
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+    async def connect(self, path: str):
+        self._reader, self._writer = await asyncio.open_unix_connection(path)
+        self._task = asyncio.create_task(self._read_responses())
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._task.cancel()
+
+    async def _read_responses(self):
+        while line := await self._reader.readline():
+            response = json.loads(line)
+            future = self._pending.pop(response["id"])
+            if response["ok"]:
+                future.set_result(response["result"])
+            else:
+                future.set_exception(ServiceError(response["error"]))
+
+    async def request(self, op: str, **args) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"id": request_id, "board": self.board, "op": op, **args}
+        self._writer.write((json.dumps(message) + "\n").encode())
+        await self._writer.drain()
+        return await future
+
+    async def load(self, image: List[int], offset: int = 0) -> dict:
+        return await self.request("load", image=list(image), offset=offset)
+
+    async def run(self, max_steps: Optional[int] = None) -> dict:
+        return await self.request("run", max_steps=max_steps)
+
+    async def step(self, count: int = 1) -> dict:
+        return await self.request("step", count=count)
+
+    async def snapshot(self) -> dict:
+        return await self.request("snapshot")
+
+    async def cancel(self) -> dict:
+        """Stops this client's run and fails its pending requests on the board."""
+        return await self.request("cancel")
+
+    async def dump(self) -> List[int]:
+        return (await self.request("dump"))["memory"]
+
+    async def reset(self) -> dict:
+        return await self.request("reset")
+
+
+def controller_backend(spec: str) -> ControllerBackend:
+    """
+    Creates a ControllerBackend from a "module:factory" spec, e.g.
+    "my_board:open_controller". The factory is called without arguments and
+    returns a controller, as described in ControllerBackend.
+    """
+    module_name, _, factory_name = spec.partition(":")
+    if not module_name or not factory_name:
+        raise ValueError(f"expected MODULE:FACTORY, got {spec!r}")
+    factory = getattr(importlib.import_module(module_name), factory_name)
+    return ControllerBackend(factory())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SPELL board access service")
+    parser.add_argument("--socket", default="/tmp/spell.sock", help="Unix socket path")
+    parser.add_argument(
+        "--mock", nargs="+", default=[], help="Names of mock boards to serve"
+    )
+    parser.add_argument(
+        "--controller",
+        nargs="+",
+        default=[],
+        metavar="NAME=MODULE:FACTORY",
+        help="Boards driven by the controller that MODULE.FACTORY() returns",
+    )
+    parser.add_argument(
+        "--quantum", type=int, default=1000, help="Instructions per time slice"
+    )
+    parser.add_argument(
+        "--not-erased",
+        action="store_true",
+        help="Read back program memory instead of assuming the boards were just reset",
+    )
+    args = parser.parse_args()
+
+    backends = {name: MockBackend() for name in args.mock}
+    for board in args.controller:
+        name, _, spec = board.partition("=")
+        if not spec:
+            parser.error(f"--controller expects NAME=MODULE:FACTORY, got {board!r}")
+        backends[name] = controller_backend(spec)
+    if not backends:
+        backends["mock0"] = MockBackend()
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    service = SpellService(backends, args.quantum, erased=not args.not_erased)
+    asyncio.run(service.serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,14 @@
 
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, RisingEdge
 from spell_controller import SpellController
+from activity import ActivityMonitor
+from power_model import RAM32PowerModel, estimate_energy
+from spell_coverage import start_coverage
+from spell_model import SpellModel
+from programs import MULTIPLY
+from trace_decoder import REG_TRACE, capture, decode
 import random
 
 
@@ -16,6 +22,7 @@ async def reset(dut):
     dut.rst_n.value = 0
     await ClockCycles(dut.clk, 10)
     dut.rst_n.value = 1
+    start_coverage(dut)
 
 
 @cocotb.test()
@@ -404,3 +411,251 @@ async def test_intg_multiply(dut):
 
     assert await spell.read_sp() == 1
     assert await spell.read_stack_top() == 110
+
+
+async def count_awake_cycles(dut, spell: SpellController) -> int:
+    """
+    Runs the program until it sleeps, and returns the number of clock
+    cycles the CPU spent outside of StateSleep.
+    """
+    cycles = 0
+
+    async def counter():
+        nonlocal cycles
+        while True:
+            await RisingEdge(dut.clk)
+            if not spell.sleeping():
+                cycles += 1
+
+    task = cocotb.start_soon(counter())
+    await spell.execute()
+    task.kill()
+    return cycles
+
+
+# Cycle costs: fetch takes 3 cycles from the RAM, or 2 when the opcode is in
+# the cached code memory word; execute takes 1, and fetching data or storing
+# takes 3 more. `make WORD_CACHE=no` builds the design without the word
+# cache (SPELL_NO_WORD_CACHE), so that CI measures the cycle counts both ways.
+WORD_CACHE = "no_word_cache" not in cocotb.plusargs
+MULTIPLY_CYCLES = 335 if WORD_CACHE else 387
+SPELL_SPELL_LOOP_CYCLES = 290 if WORD_CACHE else 340
+
+
+@cocotb.test()
+async def test_cycles_multiply(dut):
+    """
+    Cycle count of the multiply program
+    """
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    await spell.write_program(MULTIPLY)
+    cycles = await count_awake_cycles(dut, spell)
+    instructions = len(SpellModel(MULTIPLY).trace())
+    dut._log.info(
+        f"multiply: {instructions} instructions in {cycles} cycles "
+        f"({cycles / instructions:.2f} cycles per instruction)"
+    )
+
+    assert await spell.read_stack_top() == 110
+    assert instructions == 87
+    assert cycles == MULTIPLY_CYCLES
+
+
+# The "SPELL" 7-segment program from bringup/spell-spell.spl, with both DELAY
+# amounts set to 0 so that a full display loop fits in a short simulation.
+# The energy of the delays themselves is measured by test_power_sleep_vs_delay.
+# fmt: off
+SPELL_SPELL_NO_DELAY = [
+    127, 58, 119, 0, 129, 57, 57, 244, 62, 116, 109,
+    59, 119, 0, 44, 0, 59, 119, 0, 44, 11, 64, 3, 61
+]
+# fmt: on
+
+
+@cocotb.test()
+async def test_power_arithmetic(dut):
+    """
+    Energy estimate for a tight add loop
+    """
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    # acc = 0; count = 100; do { acc += 1 } while (count--)
+    await spell.write_program([0, 100, "x", 1, "+", "x", 2, "@", "z"])
+
+    monitor = ActivityMonitor(dut.user_project, dut.clk)
+    monitor.start()
+    await spell.execute()
+    report = estimate_energy("arithmetic", monitor.stop(), RAM32PowerModel())
+    dut._log.info(report)
+
+    assert await spell.read_stack_top() == 101
+    # The CPU state is only visible in RTL simulation, not in gate-level runs
+    if report.instructions is not None:
+        assert report.instructions > 101 * 6
+
+
+@cocotb.test()
+async def test_power_spell_spell(dut):
+    """
+    Energy estimate for the spell-spell display loop
+    """
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    await spell.write_program(SPELL_SPELL_NO_DELAY)
+
+    monitor = ActivityMonitor(dut.user_project, dut.clk)
+    monitor.start()
+    await spell.execute(False)
+    await ClockCycles(dut.clk, 2000)
+    report = estimate_energy("spell-spell", monitor.stop(), RAM32PowerModel())
+    dut._log.info(report)
+
+    # EN0 is tied to rst_n: both RAM32 banks are clocked on every cycle
+    assert report.ram_clocks == 2 * report.cycles
+    # The CPU state is only visible in RTL simulation, not in gate-level runs
+    if report.instructions is not None:
+        assert report.instructions > 0
+        if WORD_CACHE:
+            # Sequential fetches within a word are served by the word cache
+            assert 0 < report.ram_fetches < report.instructions
+        else:
+            # A fetch may still be in flight when the window closes
+            assert abs(report.ram_fetches - report.instructions) <= 1
+        assert report.ram_pin_energy_per_fetch > 0
+
+
+@cocotb.test()
+async def test_power_sleep_vs_delay(dut):
+    """
+    Compares the energy spent sleeping (z) with busy-waiting in DELAY (,)
+    """
+    window = 5000
+    ram = RAM32PowerModel()
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+    monitor = ActivityMonitor(dut.user_project, dut.clk)
+
+    await spell.write_program(["z"])
+    await spell.execute()
+    monitor.start()
+    await ClockCycles(dut.clk, window)
+    sleep = estimate_energy("sleep", monitor.stop(), ram)
+    dut._log.info(sleep)
+
+    await spell.set_pc(0)
+    await spell.write_program([10, ",", "z"])
+    await spell.execute(False)
+    await ClockCycles(dut.clk, 10)
+    assert dut.o_cpu_wait_delay.value == 1
+    monitor.start()
+    await ClockCycles(dut.clk, window)
+    delay = estimate_energy("delay", monitor.stop(), ram)
+    dut._log.info(delay)
+
+    assert sleep.energy_per_cycle < delay.energy_per_cycle
+
+
+@cocotb.test()
+async def test_cycles_spell_spell(dut):
+    """
+    Cycle count of a spell-spell display loop
+    """
+    first_letter = 109  # The "S" segments
+    instructions = 76  # Per display loop
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    await spell.write_program(SPELL_SPELL_NO_DELAY)
+    await spell.execute(False)
+
+    # Measure the time between two consecutive displays of the first letter
+    starts = []
+    cycle = 0
+    previous = None
+    while len(starts) < 3:
+        await RisingEdge(dut.clk)
+        cycle += 1
+        value = dut.uo_out.value.integer
+        if value == first_letter and previous != first_letter:
+            starts.append(cycle)
+        previous = value
+    period = starts[2] - starts[1]
+    dut._log.info(
+        f"spell-spell: {instructions} instructions in {period} cycles "
+        f"({period / instructions:.2f} cycles per instruction)"
+    )
+
+    assert starts[1] - starts[0] == period
+    assert period == SPELL_SPELL_LOOP_CYCLES
+
+
+async def enable_trace(spell: SpellController):
+    await spell.push(1)
+    await spell.push(REG_TRACE)
+    await spell.exec_opcode("w")
+
+
+@cocotb.test()
+async def test_trace_multiply(dut):
+    """
+    Rebuilds the multiply program's execution from the trace port
+    """
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    await enable_trace(spell)
+    await spell.write_program(MULTIPLY)
+    samples = cocotb.start_soon(capture(dut, 400))
+    await spell.execute()
+    entries = decode(await samples)
+
+    assert [(e.pc, e.opcode) for e in entries] == SpellModel(MULTIPLY).trace(1000)
+    assert all(e.lost == 0 for e in entries)
+    # Same timing as test_cycles_multiply: 3 fetch cycles before the first
+    # instruction, and the last one executes on the last awake cycle.
+    assert entries[-1].cycle - entries[0].cycle == MULTIPLY_CYCLES - 4
+    assert await spell.read_stack_top() == 110
+
+
+@cocotb.test()
+async def test_trace_spell_spell(dut):
+    """
+    Traces the spell-spell display loop at full speed
+    """
+    spell = SpellController(dut)
+    clock = Clock(dut.clk, 10, units="us")
+    cocotb.start_soon(clock.start())
+    await reset(dut)
+
+    await spell.write_program(SPELL_SPELL_NO_DELAY)
+    await enable_trace(spell)
+    samples = cocotb.start_soon(capture(dut, 2000))
+    await spell.execute(False)
+    entries = decode(await samples)
+
+    executed = SpellModel(SPELL_SPELL_NO_DELAY).trace(len(entries))
+    assert [(e.pc, e.opcode) for e in entries] == executed
+    # The display loop starts at pc 3, and takes SPELL_SPELL_LOOP_CYCLES
+    loop_starts = [e.cycle for e in entries if e.pc == 3]
+    assert len(loop_starts) >= 3
+    assert all(
+        b - a == SPELL_SPELL_LOOP_CYCLES for a, b in zip(loop_starts, loop_starts[1:])
+    )
+    # The trace port takes over portb
+    assert dut.uio_oe.value == 0xFF
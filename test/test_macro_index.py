@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout LTD
+# SPDX-License-Identifier: Apache-2.0
+
+# Tests for macro_index.py, on copies of the RAM32 views in macros/.
+# Run with: pytest test_macro_index.py
+
+import os
+import shutil
+
+import pytest
+
+from macro_index import INDEX_FILE, MACROS_DIR, MacroIndex
+
+NOM = "nom_tt_025C_1v80"
+NOM_LIB = os.path.join("RAM32.lib", NOM, f"RAM32__{NOM}.lib")
+
+
+@pytest.fixture(scope="module")
+def macros_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("macros")
+    for name in os.listdir(MACROS_DIR):
+        source = os.path.join(MACROS_DIR, name)
+        if name.endswith(".spef") or name.endswith(".v"):
+            shutil.copy(source, path)
+        elif name.endswith(".lib"):
+            shutil.copytree(source, path / name)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def index(macros_dir):
+    index = MacroIndex(macros_dir)
+    yield index
+    index.close()
+
+
+def test_clock_to_output(index):
+    # CLK -> Do0[0] rising_edge arc of the nom_tt Liberty table; the
+    # rise / fall tables cross over as the load grows
+    assert index.clock_to_output("Do0[0]", NOM, 0.00050) == pytest.approx(1.52511)
+    assert index.clock_to_output("Do0[0]", NOM, 0.00930) == pytest.approx(1.59380)
+    assert index.clock_to_output("Do0[0]", NOM, 0.17304) == pytest.approx(2.48469)
+    midpoint = (0.00050 + 0.00132) / 2
+    assert index.clock_to_output("Do0[0]", NOM, midpoint) == pytest.approx(
+        (1.52511 + 1.53512) / 2
+    )
+    assert index.clock_to_output("Do0[0]", NOM) == pytest.approx(1.5190, abs=1e-4)
+
+
+def test_net_cap(index):
+    assert index.net_cap("CLK") == pytest.approx(0.0118413)
+    assert index.compare("net_cap", "CLK") == pytest.approx(
+        {"min": 0.0107894, "nom": 0.0118413, "max": 0.0132532}
+    )
+    assert index.net_parasitics("CLK")["total_cap"] == pytest.approx(0.0118413)
+
+
+def test_lib_corners(index):
+    assert len(index.lib_corners()) == 9
+    assert index.export()["lib"][NOM]["voltage"] == pytest.approx(1.8)
+
+
+def test_reindex_on_mtime_change(tmp_path):
+    macros_dir = tmp_path / "macros"
+    (macros_dir / os.path.dirname(NOM_LIB)).mkdir(parents=True)
+    lib_path = macros_dir / NOM_LIB
+    shutil.copy(os.path.join(MACROS_DIR, NOM_LIB), lib_path)
+    index_path = macros_dir / INDEX_FILE
+
+    index = MacroIndex(str(macros_dir))
+    assert index.clock_to_output("Do0[0]", NOM, 0.0005) == pytest.approx(1.52511)
+    indexed = os.stat(index_path).st_mtime_ns
+
+    # Nothing changed: the stored index is used as is
+    MacroIndex(str(macros_dir))
+    assert os.stat(index_path).st_mtime_ns == indexed
+
+    # Same size, new content: only the mtime tells the file changed
+    text = lib_path.read_text()
+    lib_path.write_text(text.replace('values("1.52511,', 'values("2.52511,'))
+    stat = os.stat(lib_path)
+    os.utime(lib_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    index = MacroIndex(str(macros_dir))
+    assert index.clock_to_output("Do0[0]", NOM, 0.0005) == pytest.approx(2.52511)
@@ -0,0 +1,112 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+# Tests for spell_coverage.py. Run with: pytest test_spell_coverage.py
+
+import json
+from types import SimpleNamespace
+
+from spell_coverage import (
+    OPCODE_CLASS,
+    Coverage,
+    CoverageCollector,
+    StateExecute,
+    StateFetch,
+    load,
+    load_per_test,
+    save,
+    select_tests,
+)
+
+
+def coverage_with(sp=(), states=()):
+    coverage = Coverage()
+    for value in sp:
+        coverage.sp.hits[value] = 1
+    for state in states:
+        coverage.state.hits[state] = 1
+    return coverage
+
+
+def test_select_tests():
+    per_test = {
+        "small": coverage_with(sp=[0]),
+        "big": coverage_with(sp=[0, 1, 2]),
+        "subset": coverage_with(sp=[1, 2]),
+        "other": coverage_with(states=[StateFetch]),
+        "empty": Coverage(),
+    }
+    assert select_tests(per_test) == ["big", "other"]
+    assert select_tests({}) == []
+
+
+def test_merge(tmp_path):
+    first = coverage_with(sp=[3])
+    first.illegal_transitions.add((StateFetch, StateFetch + 5))
+    second = coverage_with(sp=[4], states=[StateExecute])
+    paths = [str(tmp_path / "first.json"), str(tmp_path / "second.json")]
+    save(first, paths[0])
+    save(second, paths[1])
+
+    merged = load(paths)
+    assert merged.sp.covered() == 2
+    assert merged.state.hits[StateExecute] == 1
+    assert merged.illegal_transitions == {(StateFetch, StateFetch + 5)}
+
+    # Merging is idempotent, and survives a round trip through JSON
+    merged.merge(json.loads(json.dumps(merged.to_dict())))
+    assert merged.to_dict() == load(paths).to_dict()
+
+
+def test_same_test_from_parallel_runs_is_merged(tmp_path):
+    paths = []
+    for run, sp in enumerate([5, 6]):
+        (tmp_path / f"run{run}").mkdir()
+        paths.append(str(tmp_path / f"run{run}" / "test_random.json"))
+        save(coverage_with(sp=[sp]), paths[-1])
+    paths.append(str(tmp_path / "run0" / "test_other.json"))
+    save(coverage_with(sp=[5]), paths[-1])
+
+    per_test = load_per_test(paths)
+    assert sorted(per_test) == ["test_other", "test_random"]
+    assert per_test["test_random"].sp.covered() == 2
+    assert select_tests(per_test) == ["test_random"]
+
+
+class Signal:
+    def __init__(self, value=None):
+        self.value = self
+        self._value = value
+
+    def __eq__(self, other):
+        return self._value == other
+
+    @property
+    def integer(self):
+        if self._value is None:
+            raise ValueError("Unresolvable bit in binary string: 'x'")
+        return self._value
+
+
+def test_sample_skips_unknown_values():
+    design = SimpleNamespace(
+        state=Signal(StateExecute),
+        opcode=Signal(),  # X
+        sp=Signal(1),
+        out_of_order_exec=Signal(0),
+        mem_select=Signal(1),
+        mem_type_data=Signal(1),
+        mem_write_en=Signal(),
+        mem_addr=Signal(0x38),
+        exec=SimpleNamespace(stack_belowtop=Signal()),
+    )
+    collector = CoverageCollector(SimpleNamespace(user_project=design, clk=None))
+    assert collector.sample(StateFetch, 0) == (StateExecute, 1)
+    assert collector.coverage.opcode.covered() == 0
+    assert collector.coverage.io.covered() == 0
+
+    # A loop opcode with an unknown stack_belowtop still counts as an opcode
+    design.opcode._value = ord("@")
+    collector.sample(StateFetch, 0)
+    assert collector.coverage.opcode.hits[OPCODE_CLASS[ord("@")] * 2] == 1
+    assert collector.coverage.loop.covered() == 0
@@ -0,0 +1,287 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+# Tests for spell_service.py, using the mock backend. Run with: pytest test_spell_service.py
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+from programs import MULTIPLY
+from spell_model import SpellModel, assemble
+from spell_service import (
+    MockBackend,
+    ServiceError,
+    SpellClient,
+    SpellService,
+    controller_backend,
+)
+
+MULTIPLY_IMAGE = list(assemble(MULTIPLY))
+
+# Writes 42 into its own memory at address 20, then sleeps
+SELF_MODIFY = [42, 20, ord("!"), ord("z")]
+
+
+def run_service(test, quantum=1000):
+    async def main():
+        backend = MockBackend()
+        service = SpellService({"board": backend}, quantum)
+        service.start()
+        try:
+            await test(service, backend)
+        finally:
+            await service.stop()
+
+    asyncio.run(main())
+
+
+def test_load_and_run():
+    async def test(service, backend):
+        session = service.open_session()
+        await service.request(session, "board", "load", image=MULTIPLY_IMAGE)
+        result = await service.request(session, "board", "run")
+        assert backend.writes == len(MULTIPLY_IMAGE)
+        assert result["halted"] == "sleep"
+        assert result["stack"] == [110]
+
+    run_service(test)
+
+
+def test_same_image_is_not_reloaded():
+    async def test(service, backend):
+        first = service.open_session()
+        second = service.open_session()
+        await service.request(first, "board", "load", image=MULTIPLY_IMAGE)
+        await service.request(first, "board", "run")
+        writes = backend.writes
+        await service.request(second, "board", "load", image=MULTIPLY_IMAGE)
+        result = await service.request(second, "board", "run")
+        assert result["stack"] == [110]
+        assert backend.writes == writes
+
+    run_service(test)
+
+
+def test_clients_keep_their_own_state():
+    async def test(service, backend):
+        first = service.open_session()
+        second = service.open_session()
+        await service.request(first, "board", "load", image=[1, 2, 3, ord("z")])
+        await service.request(second, "board", "load", image=[7, ord("z")])
+        await service.request(first, "board", "step", count=2)
+        await service.request(second, "board", "run")
+        result = await service.request(first, "board", "run")
+        assert result["stack"] == [1, 2, 3]
+        result = await service.request(second, "board", "snapshot")
+        assert result["stack"] == [7]
+        dump = await service.request(second, "board", "dump")
+        assert dump["memory"][:2] == [7, ord("z")]
+
+    run_service(test)
+
+
+def test_self_modifying_program():
+    async def test(service, backend):
+        first = service.open_session()
+        second = service.open_session()
+        await service.request(first, "board", "load", image=SELF_MODIFY)
+        await service.request(first, "board", "run")
+        await service.request(second, "board", "load", image=[ord("z")])
+        await service.request(second, "board", "run")
+        dump = await service.request(first, "board", "dump")
+        assert dump["memory"][20] == 42
+        dump = await service.request(second, "board", "dump")
+        assert dump["memory"][20] == 0xFF
+
+    run_service(test)
+
+
+def test_self_modifying_loop_keeps_the_shadow():
+    class CountingBackend(MockBackend):
+        reads = 0
+
+        async def read_byte(self, addr):
+            self.reads += 1
+            return await super().read_byte(addr)
+
+    async def main():
+        backend = CountingBackend()
+        service = SpellService({"board": backend})
+        service.start()
+        try:
+            session = service.open_session()
+            # Writes 42 to address 20, forever
+            image = [42, 20, ord("!"), 0, ord("=")]
+            await service.request(session, "board", "load", image=image)
+            await service.request(session, "board", "run", max_steps=50)
+            # One read back per write, none for the other instructions
+            assert backend.reads == 10
+            dump = await service.request(session, "board", "dump")
+            assert dump["memory"][20] == 42
+        finally:
+            await service.stop()
+
+    asyncio.run(main())
+
+
+def test_time_slicing():
+    async def test(service, backend):
+        looping = service.open_session()
+        short = service.open_session()
+        await service.request(looping, "board", "load", image=[0, ord("=")])
+        await service.request(short, "board", "load", image=[5, ord("z")])
+        endless = asyncio.create_task(service.request(looping, "board", "run"))
+        await asyncio.sleep(0)
+        result = await asyncio.wait_for(service.request(short, "board", "run"), 5)
+        assert result["stack"] == [5]
+        assert not endless.done()
+        endless.cancel()
+
+    run_service(test, quantum=10)
+
+
+def test_pipelined_requests_keep_their_order():
+    async def test(service, backend):
+        session = service.open_session()
+        await service.request(session, "board", "load", image=[0, ord("=")])
+        # The run takes 10 slices; the load and snapshot must wait for all of them
+        run, load, snapshot = await asyncio.gather(
+            service.request(session, "board", "run", max_steps=100),
+            service.request(session, "board", "load", image=[ord("z")]),
+            service.request(session, "board", "snapshot"),
+        )
+        assert run["halted"] is None
+        assert service.boards["board"].steps == 100
+        assert snapshot == {key: run[key] for key in ("pc", "sp", "stack")}
+        result = await service.request(session, "board", "run")
+        assert result["halted"] == "sleep"
+
+    run_service(test, quantum=10)
+
+
+def test_socket_clients():
+    async def test(service, backend):
+        path = os.path.join(tempfile.mkdtemp(), "spell.sock")
+        server = await asyncio.start_unix_server(service._handle_client, path=path)
+        clients = [SpellClient("board") for _ in range(4)]
+        for client in clients:
+            await client.connect(path)
+        loads = await asyncio.gather(*(client.load(MULTIPLY_IMAGE) for client in clients))
+        assert len(set(load["hash"] for load in loads)) == 1
+        results = await asyncio.gather(*(client.run() for client in clients))
+        assert all(result["stack"] == [110] for result in results)
+        assert backend.writes == len(MULTIPLY_IMAGE)
+        for client in clients:
+            await client.close()
+        server.close()
+
+    run_service(test)
+
+
+class ModelController:
+    """Synchronous controller with the SpellController interface, over the model"""
+
+    def __init__(self):
+        self.model = SpellModel()
+
+    def write_progmem(self, addr, value):
+        self.model.code[addr] = value
+
+    def exec_opcode(self, opcode):
+        self.model.execute(ord(opcode), out_of_order=True)
+
+    def read_pc(self):
+        return self.model.pc
+
+    def set_pc(self, value):
+        self.model.pc = value
+
+    def read_sp(self):
+        return self.model.sp
+
+    def set_sp(self, value):
+        self.model.sp = value
+
+    def read_stack_top(self):
+        return self.model.stack_top
+
+    def push(self, value):
+        self.model.push(value)
+
+    def single_step(self):
+        self.model.step()
+
+
+def test_controller_backend():
+    async def main():
+        sys.modules["model_board"] = SimpleNamespace(open_controller=ModelController)
+        try:
+            backend = controller_backend("model_board:open_controller")
+        finally:
+            del sys.modules["model_board"]
+        service = SpellService({"board": backend}, erased=False)
+        service.start()
+        try:
+            session = service.open_session()
+            await service.request(session, "board", "load", image=SELF_MODIFY)
+            result = await service.request(session, "board", "run")
+            assert result["halted"] == "sleep"
+            assert backend.controller.model.code[20] == 42
+            dump = await service.request(session, "board", "dump")
+            assert dump["memory"][:4] == SELF_MODIFY
+            assert dump["memory"][20] == 42
+        finally:
+            await service.stop()
+
+    asyncio.run(main())
+
+
+def test_cancel_endless_run():
+    async def test(service, backend):
+        session = service.open_session()
+        await service.request(session, "board", "load", image=[0, ord("=")])
+        endless = asyncio.create_task(service.request(session, "board", "run"))
+        await asyncio.sleep(0.05)
+        assert service.boards["board"].steps > 0
+        result = await service.request(session, "board", "cancel")
+        assert result == {"cancelled": 1}
+        with pytest.raises(ServiceError, match="cancelled"):
+            await endless
+        steps = service.boards["board"].steps
+        snapshot = await service.request(session, "board", "snapshot")
+        assert snapshot["pc"] in (0, 1)
+        assert service.boards["board"].steps == steps
+
+    run_service(test, quantum=10)
+
+
+def test_disconnect_during_endless_run():
+    async def test(service, backend):
+        path = os.path.join(tempfile.mkdtemp(), "spell.sock")
+        server = await asyncio.start_unix_server(service._handle_client, path=path)
+        board = service.boards["board"]
+        client = SpellClient("board")
+        await client.connect(path)
+        await client.load([0, ord("=")])
+        endless = asyncio.create_task(client.run())
+        await asyncio.sleep(0.05)
+        assert board.steps > 0
+        await client.close()
+        endless.cancel()
+
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not board.contexts and not board.jobs:
+                break
+        assert not board.contexts and not board.jobs and not board.carried
+        steps = board.steps
+        await asyncio.sleep(0.05)
+        assert board.steps == steps
+        server.close()
+
+    run_service(test, quantum=10)
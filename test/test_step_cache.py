@@ -0,0 +1,194 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout LTD
+# SPDX-License-Identifier: Apache-2.0
+
+# Tests for step_cache.py. The steps below stand in for OpenLane steps: they
+# go through the same start() / run() sequence as Step.start(), and the flow
+# driver follows SequentialFlow.run(), so no PDK is needed.
+# Run with: pytest test_step_cache.py
+
+import json
+import os
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("openlane")
+
+from openlane.common import Path  # noqa: E402
+from openlane.state import DesignFormat, State  # noqa: E402
+
+from step_cache import StepCache  # noqa: E402
+
+
+class FakeStep:
+    id = "Fake.Step"
+    config_vars = []
+    outputs = []
+
+    def __init__(self, config, state_in):
+        self.config = config
+        self.state_in = state_in
+        self.runs = 0
+
+    def start(self, step_dir):
+        self.step_dir = step_dir
+        os.makedirs(step_dir, exist_ok=True)
+        views_updates, metrics_updates = self.run(self.state_in)
+        metrics = dict(self.state_in.metrics)
+        metrics.update(metrics_updates)
+        state_out = State(self.state_in, overrides=views_updates, metrics=metrics)
+        state_out.validate()
+        return state_out
+
+
+class Synth(FakeStep):
+    id = "Test.Synth"
+    outputs = [DesignFormat.NETLIST]
+    calls = 0
+
+    def run(self, state_in, **kwargs):
+        Synth.calls += 1
+        with open(str(self.config["SOURCE"]), "r") as f:
+            source = f.read()
+        netlist = os.path.join(self.step_dir, "design.nl.v")
+        with open(netlist, "w") as f:
+            f.write(f"// synthesized\n{source}")
+        return {DesignFormat.NETLIST: Path(netlist)}, {"cells": len(source)}
+
+
+class Place(FakeStep):
+    id = "Test.Place"
+    outputs = [DesignFormat.DEF]
+    calls = 0
+
+    def run(self, state_in, **kwargs):
+        Place.calls += 1
+        with open(str(state_in[DesignFormat.NETLIST]), "r") as f:
+            netlist = f.read()
+        def_file = os.path.join(self.step_dir, "design.def")
+        with open(def_file, "w") as f:
+            f.write(f"# placed\n{netlist}")
+        return {DesignFormat.DEF: Path(def_file)}, {}
+
+
+class Floorplan(FakeStep):
+    """Reports its metrics as Decimal, like OpenLane's OpenROAD steps"""
+
+    id = "Test.Floorplan"
+    metrics = {"design__die__area": Decimal("311138.6784")}
+    calls = 0
+
+    def run(self, state_in, **kwargs):
+        Floorplan.calls += 1
+        with open(os.path.join(self.step_dir, "or_metrics_out.json"), "w") as f:
+            f.write("{}")
+        return {}, dict(Floorplan.metrics)
+
+
+def run_flow(steps, config, run_dir):
+    """Mimics SequentialFlow.run(): instantiates and starts each step class"""
+    state = State()
+    for index, step_cls in enumerate(steps):
+        step = step_cls(config, state)
+        state = step.start(os.path.join(run_dir, f"{index + 1}-{step.id}"))
+    return state
+
+
+@pytest.fixture
+def design(tmp_path):
+    Synth.calls = Place.calls = Floorplan.calls = 0
+    source = tmp_path / "src" / "design.v"
+    source.parent.mkdir()
+    source.write_text("module design; endmodule\n")
+    return {"SOURCE": Path(str(source))}
+
+
+def test_second_run_skips_steps(tmp_path, design):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    steps = cache.wrap_steps([Synth, Place])
+    assert cache.wrap_steps(steps) == steps
+
+    first = run_flow(steps, design, str(tmp_path / "run1"))
+    second = run_flow(steps, design, str(tmp_path / "run2"))
+
+    assert Synth.calls == 1 and Place.calls == 1
+    assert [result for _, result in cache.results] == ["ran", "ran", "skipped", "skipped"]
+    def_file = second[DesignFormat.DEF]
+    assert isinstance(def_file, Path)
+    assert def_file.startswith(str(tmp_path / "run2"))
+    with open(str(def_file)) as f:
+        assert f.read() == "# placed\n// synthesized\nmodule design; endmodule\n"
+    assert second.metrics["cells"] == first.metrics["cells"]
+
+
+def test_key_depends_on_source_content(tmp_path, design):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    step = Synth(design, State())
+    key = cache.key_for(step, State())
+    assert cache.key_for(Synth(design, State()), State()) == key
+
+    with open(str(design["SOURCE"]), "a") as f:
+        f.write("// edited\n")
+    assert cache.key_for(step, State()) != key
+
+
+def test_key_depends_on_upstream_output(tmp_path, design):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    netlist = tmp_path / "1-synth" / "design.nl.v"
+    netlist.parent.mkdir()
+    netlist.write_text("module design; endmodule\n")
+    state_in = State(overrides={DesignFormat.NETLIST: Path(str(netlist))})
+    step = Place(design, state_in)
+    key = cache.key_for(step, state_in)
+
+    # Same path, new content: a re-run of the upstream step changed its output
+    netlist.write_text("module design(input clk); endmodule\n")
+    assert cache.key_for(step, state_in) != key
+
+
+def test_key_hashes_directory_views(tmp_path, design):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    views = tmp_path / "views"
+    (views / "sub").mkdir(parents=True)
+    (views / "sub" / "a.lef").write_text("MACRO a\n")
+    state_in = State(overrides={DesignFormat.LEF: Path(str(views))})
+    step = Place(design, state_in)
+    key = cache.key_for(step, state_in)
+
+    (views / "sub" / "a.lef").write_text("MACRO b\n")
+    assert cache.key_for(step, state_in) != key
+
+
+def test_decimal_metrics(tmp_path, design):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    steps = cache.wrap_steps([Floorplan])
+    run_flow(steps, design, str(tmp_path / "run1"))
+    second = run_flow(steps, design, str(tmp_path / "run2"))
+
+    assert Floorplan.calls == 1
+    area = second.metrics["design__die__area"]
+    assert isinstance(area, Decimal)
+    assert area == Floorplan.metrics["design__die__area"]
+
+
+def test_failed_store_leaves_nothing_behind(tmp_path, design, monkeypatch):
+    cache = StepCache(str(tmp_path / "cache"), 1 << 30)
+    monkeypatch.setattr(Floorplan, "metrics", {"unserializable": object()})
+    with pytest.raises(Exception):
+        run_flow(cache.wrap_steps([Floorplan]), design, str(tmp_path / "run"))
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = StepCache(str(tmp_path / "cache"), 250)
+    for age, key in enumerate(["oldest", "old", "new", "newest"]):
+        entry_dir = tmp_path / "cache" / key
+        entry_dir.mkdir(parents=True)
+        entry_file = entry_dir / "entry.json"
+        entry_file.write_text(json.dumps({"size": 100}))
+        os.utime(entry_file, (1000 + age, 1000 + age))
+    # Not an entry: left alone
+    (tmp_path / "cache" / "partial.tmp1").mkdir()
+
+    cache.evict()
+    assert sorted(os.listdir(cache.cache_dir)) == ["new", "newest", "partial.tmp1"]
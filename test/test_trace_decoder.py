@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+import random
+
+from programs import MULTIPLY
+from spell_model import SpellModel
+from trace_decoder import decode, encode, profile
+
+
+def execute_events(executed, cycles_per_instruction=4):
+    return [
+        (index * cycles_per_instruction, pc, opcode)
+        for index, (pc, opcode) in enumerate(executed)
+    ]
+
+
+def test_round_trip():
+    executed = SpellModel(MULTIPLY).trace()
+    entries = decode(encode(execute_events(executed)))
+    assert [(e.pc, e.opcode) for e in entries] == executed
+    assert all(e.lost == 0 for e in entries)
+
+
+def test_back_to_back_packets():
+    # Full packets are 3 beats long: the shortest possible instruction
+    executed = SpellModel(MULTIPLY).trace()
+    entries = decode(encode(execute_events(executed, 3)))
+    assert [(e.pc, e.opcode) for e in entries] == executed
+
+
+def test_capture_starts_mid_packet():
+    executed = SpellModel(MULTIPLY).trace()
+    samples = encode(execute_events(executed))
+    entries = decode(samples[42:])
+    first_full = next(i for i, e in enumerate(entries) if e.pc is not None)
+    assert first_full < 16
+    known = [(e.pc, e.opcode) for e in entries[first_full:]]
+    assert known == executed[len(executed) - len(known) :]
+
+
+def test_dropped_packet_without_cycle_numbers():
+    executed = SpellModel(MULTIPLY).trace()
+    samples = encode(execute_events(executed))
+    # Remove the 6th packet (a sequential one) entirely
+    del samples[21:23]
+    entries = decode(samples)
+    assert len(entries) == len(executed) - 1
+    assert entries[5].lost == 1
+    for entry in entries[5:]:
+        assert entry.pc is None or (entry.pc, entry.opcode) in executed
+
+
+def test_random_drops():
+    rng = random.Random(1337)
+    executed = SpellModel(MULTIPLY).trace()
+    events = execute_events(executed)
+    samples = [
+        (cycle, value)
+        for cycle, value in enumerate(encode(events))
+        if rng.random() > 0.05
+    ]
+    entries = decode(samples)
+    by_cycle = {cycle + 1: (pc, opcode) for cycle, pc, opcode in events}
+
+    assert len(entries) + sum(e.lost for e in entries) == len(executed)
+    for entry in entries:
+        pc, opcode = by_cycle[entry.cycle]
+        assert entry.opcode == opcode
+        assert entry.pc in (None, pc)
+    assert sum(e.pc is not None for e in entries) > len(executed) // 2
+
+
+def test_profile():
+    executed = SpellModel(MULTIPLY).trace()
+    result = profile(decode(encode(execute_events(executed))))
+    # The loop body at 6..12 runs 11 times
+    assert result[6] == (11, 44)
+    assert result[16][0] == 1
@@ -0,0 +1,205 @@
+# SPDX-FileCopyrightText: © 2024 Uri Shaked <uri@tinytapeout.com>
+# SPDX-License-Identifier: MIT
+
+"""
+Decoder for the SPELL execution trace port.
+
+Writing 1 to the TRACE register (0x3C) makes portb (uio) output one packet
+per executed instruction, while the CPU runs at full speed (see src/trace.v
+for the format). The decoder takes one sample of the pins per clock cycle
+and rebuilds the (pc, opcode) stream. Samples may be missing: a packet that
+was cut short is dropped, and the packet sequence numbers tell how many
+instructions were lost. The PC is recovered at the next full packet.
+
+Samples are either plain values, one per cycle, or (cycle, value) pairs. Use
+pairs when the sampler can drop samples, so that gaps are detected even
+inside a packet. A capture from the demo board (bringup/spell-spell.py,
+trace()) has one "cycle value" pair per line, in hex, and can be profiled
+from the command line:
+
+    python trace_decoder.py capture.txt
+"""
+
+import argparse
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+REG_TRACE = 0x3C
+
+SEQ_MODULO = 16
+
+Sample = Union[Optional[int], Tuple[int, Optional[int]]]
+
+
+@dataclass
+class TraceEntry:
+    opcode: int
+    # None until the decoder sees a full packet after losing samples
+    pc: Optional[int]
+    # Cycle of the packet header, i.e. the cycle after StateExecute
+    cycle: int
+    # Instructions lost right before this one. This is a lower bound, as the
+    # sequence number wraps every 16 packets.
+    lost: int = 0
+
+
+def encode(trace: Iterable[Tuple[int, int, int]]) -> List[int]:
+    """
+    Reference encoder, following src/trace.v: turns (cycle, pc, opcode)
+    execute events into the samples the trace port outputs, starting at
+    cycle 0. The first event is the first one after tracing was enabled.
+    """
+    samples = []
+    seq = 0
+    expected_pc = None
+    for cycle, pc, opcode in trace:
+        full = seq == 0 or pc != expected_pc
+        beats = [0x80 | opcode >> 1, (opcode & 1) << 6 | full << 5 | seq << 1]
+        if full:
+            beats[1] |= pc >> 7
+            beats.append(pc & 0x7F)
+        samples += [0] * (cycle + 1 - len(samples))
+        samples += beats
+        seq = (seq + 1) % SEQ_MODULO
+        expected_pc = (pc + 1) & 0xFF
+    return samples
+
+
+class TraceDecoder:
+    def __init__(self):
+        self.entries: List[TraceEntry] = []
+        self._cycle = -1
+        self._beats: List[int] = []
+        self._header_cycle = 0
+        self._pc: Optional[int] = None
+        self._seq: Optional[int] = None
+        self._broken = False
+
+    def _abort(self):
+        if self._beats:
+            self._broken = True
+        self._beats = []
+
+    def feed(self, value: Optional[int], cycle: Optional[int] = None):
+        """
+        Feeds one sample. `value` is None for a sample that is known to be
+        missing; `cycle` is the sample's cycle number, if the sampler has one.
+        """
+        if cycle is None:
+            cycle = self._cycle + 1
+        elif cycle != self._cycle + 1:
+            self._abort()
+        self._cycle = cycle
+        if value is None:
+            self._abort()
+        elif value & 0x80:
+            self._abort()
+            self._beats = [value]
+            self._header_cycle = cycle
+        elif self._beats:
+            self._beats.append(value)
+            self._packet()
+
+    def _packet(self):
+        header, data = self._beats[0], self._beats[1]
+        full = bool(data & 0x20)
+        if full and len(self._beats) < 3:
+            return
+        pc_beat = self._beats[2] if full else 0
+        self._beats = []
+
+        seq = (data >> 1) & 0xF
+        lost = 0 if self._seq is None else (seq - self._seq - 1) % SEQ_MODULO
+        if lost or self._broken:
+            self._pc = None
+        self._broken = False
+        self._seq = seq
+
+        if full:
+            self._pc = (data & 1) << 7 | pc_beat
+        elif self._pc is not None:
+            self._pc = (self._pc + 1) & 0xFF
+        opcode = (header & 0x7F) << 1 | (data >> 6) & 1
+        self.entries.append(TraceEntry(opcode, self._pc, self._header_cycle, lost))
+
+    def decode(self, samples: Iterable[Sample]) -> List[TraceEntry]:
+        for sample in samples:
+            if isinstance(sample, tuple):
+                self.feed(sample[1], sample[0])
+            else:
+                self.feed(sample)
+        return self.entries
+
+
+def decode(samples: Iterable[Sample]) -> List[TraceEntry]:
+    return TraceDecoder().decode(samples)
+
+
+def profile(entries: List[TraceEntry]) -> Dict[int, Tuple[int, int]]:
+    """
+    Maps each PC to (times executed, cycles spent). The cycles of an
+    instruction run until the next one; they are only counted when no
+    instruction was lost in between.
+    """
+    counts: Counter = Counter()
+    cycles: Counter = Counter()
+    for entry, following in zip(entries, entries[1:] + [None]):
+        if entry.pc is None:
+            continue
+        counts[entry.pc] += 1
+        if following is not None and following.lost == 0:
+            cycles[entry.pc] += following.cycle - entry.cycle
+    return {pc: (counts[pc], cycles[pc]) for pc in sorted(counts)}
+
+
+async def capture(dut, cycles: int) -> List[int]:
+    """
+    Samples the trace port (uio_out) of the cocotb testbench every clock.
+    """
+    from cocotb.triggers import RisingEdge
+
+    samples = []
+    for _ in range(cycles):
+        await RisingEdge(dut.clk)
+        samples.append(dut.uio_out.value.integer)
+    return samples
+
+
+def _opcode_name(opcode: int) -> str:
+    return repr(chr(opcode)) if 32 < opcode < 127 else str(opcode)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", help='File with one "cycle value" hex pair per line')
+    parser.add_argument("--list", action="store_true", help="Print the decoded trace")
+    args = parser.parse_args(argv)
+
+    samples = []
+    with open(args.capture, "r") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                samples.append((int(fields[0], 16), int(fields[1], 16)))
+    entries = decode(samples)
+
+    if args.list:
+        for entry in entries:
+            pc = "??" if entry.pc is None else f"{entry.pc:02x}"
+            lost = f"  ({entry.lost} lost)" if entry.lost else ""
+            print(f"{entry.cycle:8} {pc} {_opcode_name(entry.opcode)}{lost}")
+
+    opcodes = {entry.pc: entry.opcode for entry in entries if entry.pc is not None}
+    lost = sum(entry.lost for entry in entries)
+    print(f"{len(entries)} instructions decoded, at least {lost} lost")
+    print(" pc  opcode   count  cycles  cycles/instr")
+    for pc, (count, spent) in profile(entries).items():
+        print(
+            f" {pc:02x}  {_opcode_name(opcodes[pc]):6} {count:7} {spent:7} "
+            f"{spent / count:13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()